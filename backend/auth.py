@@ -1,26 +1,61 @@
-from datetime import datetime, timedelta
-from typing import Union, Optional, Dict, Any
-from jose import JWTError, jwt
+from datetime import datetime, timedelta, timezone
+from typing import Union, Optional, Dict, Any, Tuple
+from collections import OrderedDict
+import jwt
+from jwt import InvalidTokenError
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from config import settings
+from config import get_settings
 from crud import user_crud
+import hashlib
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
 # Security
 security = HTTPBearer()
 
+# A single verified decode that also enforces the claims we rely on
+_DECODE_OPTIONS = {"verify_signature": True, "require": ["exp", "sub"]}
+
+# Verified-token cache: sha256(token) -> (user, expires_at). Entries live for at
+# most TOKEN_CACHE_TTL seconds (bounds revocation lag) and never outlive the token.
+TOKEN_CACHE_TTL = 5
+TOKEN_CACHE_MAXSIZE = 10_000
+_TOKEN_CACHE: "OrderedDict[bytes, Tuple[Dict[str, Any], float]]" = OrderedDict()
+
+
+def _token_cache_get(key: bytes) -> Optional[Dict[str, Any]]:
+    """Return cached user for a token hash if still fresh"""
+    entry = _TOKEN_CACHE.get(key)
+    if entry is None:
+        return None
+    user, expires_at = entry
+    if expires_at <= time.time():
+        _TOKEN_CACHE.pop(key, None)
+        return None
+    _TOKEN_CACHE.move_to_end(key)
+    return user
+
+
+def _token_cache_set(key: bytes, user: Dict[str, Any], token_exp: Optional[float]) -> None:
+    """Store a verified user, evicting the least recently used entry when full"""
+    expires_at = time.time() + TOKEN_CACHE_TTL
+    if token_exp is not None:
+        expires_at = min(expires_at, float(token_exp))
+    _TOKEN_CACHE[key] = (user, expires_at)
+    _TOKEN_CACHE.move_to_end(key)
+    while len(_TOKEN_CACHE) > TOKEN_CACHE_MAXSIZE:
+        _TOKEN_CACHE.popitem(last=False)
+
 def create_access_token(data: dict, expires_delta: Union[timedelta, None] = None):
     """Create JWT access token"""
     to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=15)
+    expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=15))
     
     to_encode.update({"exp": expire})
+    settings = get_settings()
     encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
     return encoded_jwt
 
@@ -31,19 +66,24 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+    cache_key = hashlib.sha256(credentials.credentials.encode()).digest()
+    cached_user = _token_cache_get(cache_key)
+    if cached_user is not None:
+        return cached_user
     
     try:
-        payload = jwt.decode(credentials.credentials, settings.secret_key, algorithms=[settings.algorithm])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-    except JWTError:
+        settings = get_settings()
+        payload = jwt.decode(credentials.credentials, settings.secret_key, algorithms=[settings.algorithm], options=_DECODE_OPTIONS)
+        email: str = payload["sub"]
+    except InvalidTokenError:
         raise credentials_exception
     
     user = await user_crud.get_user_by_email(email)
     if user is None:
         raise credentials_exception
     
+    _token_cache_set(cache_key, user, payload.get("exp"))
     return user
 
 async def get_current_active_user(current_user: Dict[str, Any] = Depends(get_current_user)) -> Dict[str, Any]:
@@ -1,8 +1,11 @@
-from pydantic_settings import BaseSettings
+from functools import lru_cache
+from pydantic_settings import BaseSettings, SettingsConfigDict
 from typing import Optional
 
 
 class Settings(BaseSettings):
+    model_config = SettingsConfigDict(extra='ignore', env_file='.env', case_sensitive=False, frozen=True)
+
     # MongoDB Configuration
     mongodb_uri: str
     database_name: str = "tripcraft"
@@ -11,6 +14,9 @@ class Settings(BaseSettings):
     secret_key: str
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
+    # Optional: calibrate the argon2 time cost at startup so a password hash
+    # takes about this long on the host (fixed default cost when unset)
+    password_hash_target_ms: Optional[float] = None
 
     # Server Configuration
     host: str = "0.0.0.0"
@@ -21,6 +27,8 @@ class Settings(BaseSettings):
     amadeus_client_id: str
     amadeus_client_secret: str
     amadeus_hostname: str = "test.api.amadeus.com"
+    # Optional: SQLite file for the Amadeus autocomplete cache (defaults to backend/.cache/)
+    amadeus_cache_path: Optional[str] = None
 
 
     # Grok API Configuration
@@ -30,15 +38,21 @@ class Settings(BaseSettings):
     groq_model: Optional[str] = None
     # Optional: Live FX rates endpoint (e.g., https://api.exchangerate.host/convert)
     fx_api_url: Optional[str] = None
-    
-    
-    class Config:
-        env_file = ".env"
-        case_sensitive = False
 
+    # SerpApi (Google Hotels) Configuration
+    serpapi_api_key: Optional[str] = None
+    serpapi_gl: Optional[str] = None
+    serpapi_hl: Optional[str] = None
+    serpapi_currency: Optional[str] = None
+
+    # Stripe Configuration
+    stripe_secret_key: Optional[str] = None
+    premium_priceid: Optional[str] = None
+    web_hook_secret: Optional[str] = None
 
-    
 
 
-# Create settings instance
-settings = Settings()
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Return the process-wide Settings, parsing the environment/.env only once"""
+    return Settings()
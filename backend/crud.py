@@ -1,29 +1,181 @@
-from pymongo.collection import Collection
+from motor.motor_asyncio import AsyncIOMotorCollection
 from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
 from passlib.context import CryptContext
-from datetime import datetime, timedelta
+import bcrypt
+from datetime import datetime, timezone
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from models import UserCreate, UserUpdate
-from database import db_manager
+from database import EMAIL_COLLATION, db_manager
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import asyncio
 import logging
+import os
+import time
 
 
 logger = logging.getLogger(__name__)
 
+# Plans a basic-subscription user may generate per (UTC) day
+BASIC_DAILY_PLAN_LIMIT = 1
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+SECONDS_PER_DAY = 86400
+PREMIUM_PERIOD_SECONDS = 30 * SECONDS_PER_DAY
+
+# Timestamps are stored as epoch seconds; legacy datetime fields are migrated
+# into their *_ts counterpart once (see migrate_legacy_timestamps).
+_LEGACY_TS_FIELDS = {
+    "created_at": "created_at_ts",
+    "updated_at": "updated_at_ts",
+    "last_plan_date": "last_plan_ts",
+    "subscription_expiry": "subscription_expiry_ts",
+}
+
+
+def _now_ts() -> int:
+    """Current time as integer epoch seconds"""
+    return int(time.time())
+
+
+@lru_cache(maxsize=4096)
+def _oid(user_id: str) -> ObjectId:
+    """ObjectId for a user id string; the same ids come back on every authenticated request"""
+    return ObjectId(user_id)
+
+
+def _normalize_email(email: str) -> str:
+    """Emails are stored trimmed and lower-cased (older accounts may not be; see EMAIL_COLLATION)"""
+    return email.strip().lower()
+
+
+def has_active_premium(user: Dict[str, Any]) -> bool:
+    """True if an already-loaded user document carries an unexpired premium subscription"""
+    if user.get("subscription_type") != "premium":
+        return False
+    expiry_ts = user.get("subscription_expiry_ts")
+    return expiry_ts is not None and expiry_ts > _now_ts()
+
+
+# Fields never needed when resolving a user for a response or an auth check
+_AUTH_PROJECTION = {"password": 0, "payment_details": 0}
+
+# Password hashing: argon2 for new hashes, through argon2-cffi directly. Salt and
+# digest sizes match the hashes passlib wrote before, so those need no re-hash.
+# ARGON2_TIME_COST is the floor; calibrate_password_hashing may raise it at startup.
+ARGON2_TIME_COST = 2
+ARGON2_MEMORY_COST = 19456
+ARGON2_MAX_TIME_COST = 10
+
+
+def _make_hasher(time_cost: int) -> PasswordHasher:
+    return PasswordHasher(
+        time_cost=time_cost,
+        memory_cost=ARGON2_MEMORY_COST,
+        parallelism=1,
+        hash_len=16,
+        salt_len=16,
+    )
+
+
+_argon2 = _make_hasher(ARGON2_TIME_COST)
+
+# Legacy bcrypt variants stay verifiable and are re-hashed with argon2 on the next
+# successful login. Standard bcrypt hashes are checked by the bcrypt module directly;
+# passlib is left for bcrypt_sha256 and rarer formats.
+_legacy_context = CryptContext(schemes=["bcrypt_sha256", "bcrypt"])
+_BCRYPT_PREFIXES = ("$2a$", "$2b$", "$2y$")
+
+# Verified against when the account does not exist (see authenticate_user)
+_DUMMY_HASH = _argon2.hash("not-a-real-password")
+
+# KDF work runs on a dedicated thread pool so concurrent logins use every core:
+# argon2-cffi and bcrypt release the GIL while hashing. Created lazily on first use.
+_KDF_POOL: Optional[ThreadPoolExecutor] = None
+
+
+def _set_time_cost(time_cost: int) -> None:
+    """Switch the argon2 time cost used for new hashes"""
+    global _argon2
+    if time_cost != _argon2.time_cost:
+        _argon2 = _make_hasher(time_cost)
+
+
+def _get_kdf_pool() -> ThreadPoolExecutor:
+    global _KDF_POOL
+    if _KDF_POOL is None:
+        _KDF_POOL = ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix="kdf")
+    return _KDF_POOL
+
+
+def calibrate_password_hashing(target_ms: float) -> int:
+    """Raise the argon2 time cost to the largest one hashing within ``target_ms`` on
+    this machine (never below ARGON2_TIME_COST) and return it. Run once at startup."""
+    global _DUMMY_HASH
+    chosen = ARGON2_TIME_COST
+    for time_cost in range(ARGON2_TIME_COST, ARGON2_MAX_TIME_COST + 1):
+        hasher = _make_hasher(time_cost)
+        start = time.perf_counter()
+        hasher.hash("calibration")
+        if (time.perf_counter() - start) * 1000 > target_ms:
+            break
+        chosen = time_cost
+    _set_time_cost(chosen)
+    _DUMMY_HASH = _argon2.hash("not-a-real-password")
+    return chosen
+
+
+def shutdown_kdf_pool() -> None:
+    """Stop the password hashing threads (called on app shutdown)"""
+    global _KDF_POOL
+    if _KDF_POOL is not None:
+        _KDF_POOL.shutdown(wait=False, cancel_futures=True)
+        _KDF_POOL = None
+
+
+# Run on the KDF pool through _run_kdf
+def _hash_password(password: str) -> str:
+    return _argon2.hash(password)
+
+
+def _verify_password(plain_password: str, hashed_password: str) -> bool:
+    if hashed_password.startswith("$argon2"):
+        try:
+            return _argon2.verify(hashed_password, plain_password)
+        except (VerificationError, InvalidHashError):
+            return False
+    if hashed_password.startswith(_BCRYPT_PREFIXES):
+        # Plain bcrypt goes straight to the C library, which compares in constant time
+        return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password.encode("ascii"))
+    return _legacy_context.verify(plain_password, hashed_password)
+
+
+def _verify_and_update(plain_password: str, hashed_password: str):
+    """Return (valid, new_hash); new_hash is set when the stored hash should be replaced"""
+    if not _verify_password(plain_password, hashed_password):
+        return False, None
+    if hashed_password.startswith("$argon2") and not _argon2.check_needs_rehash(hashed_password):
+        return True, None
+    return True, _argon2.hash(plain_password)
+
+
+async def _run_kdf(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(_get_kdf_pool(), func, *args)
 
 class UserCRUD:
     def __init__(self):
         self.collection_name = "users"
     
-    def get_collection(self) -> Collection:
-        """Get users collection"""
-        if db_manager.database is None:
+    def get_collection(self) -> AsyncIOMotorCollection:
+        """Get users collection (bound once by db_manager.connect)"""
+        users = db_manager.users
+        if users is None:
             raise Exception("Database not connected")
-        return db_manager.get_collection(self.collection_name)
+        return users
     
     def _format_user_response(self, user_doc: Dict[str, Any]) -> Dict[str, Any]:
         """Convert MongoDB document to response format"""
@@ -37,53 +189,123 @@ class UserCRUD:
         # Remove password from response
         if "password" in user_doc:
             del user_doc["password"]
+
+        # Response models expose datetimes; pydantic parses the epoch ints
+        for field in ("created_at", "updated_at"):
+            ts = user_doc.pop(f"{field}_ts", None)
+            if ts is not None:
+                user_doc[field] = ts
         
         return user_doc
+
+    async def run_migrations(self) -> None:
+        """Run the one-off data migrations that have not completed yet (called at startup)
+
+        Completion is recorded in the meta collection, so later startups skip the scans.
+        """
+        migrations = (
+            ("legacy_timestamps", self.migrate_legacy_timestamps),
+            ("payment_details", self.migrate_payment_details),
+        )
+        for name, migrate in migrations:
+            marker = {"_id": f"migration:{name}"}
+            if await db_manager.meta.find_one(marker, projection={"_id": 1}):
+                continue
+            changed = await migrate()
+            await db_manager.meta.update_one(marker, {"$set": {"completed_ts": _now_ts()}}, upsert=True)
+            logger.info(f"Migration {name} completed ({changed} documents changed)")
+
+    async def migrate_legacy_timestamps(self) -> int:
+        """Move legacy datetime fields of all user documents to epoch seconds
+
+        Returns how many documents were changed.
+        """
+        collection = self.get_collection()
+        migrated = 0
+        for old_field, ts_field in _LEGACY_TS_FIELDS.items():
+            old = f"${old_field}"
+            as_ts = {"$cond": [
+                {"$eq": [{"$type": old}, "date"]},
+                {"$toLong": {"$divide": [{"$toLong": old}, 1000]}},
+                old,
+            ]}
+            result = await collection.update_many(
+                {old_field: {"$exists": True}},
+                [
+                    {"$set": {ts_field: {"$ifNull": [f"${ts_field}", as_ts]}}},
+                    {"$unset": old_field},
+                ],
+            )
+            migrated += result.modified_count
+        return migrated
+
+    async def migrate_payment_details(self) -> int:
+        """Copy legacy payment_details arrays into the payments collection, then drop them
+
+        Re-running is safe: each payment is upserted on its own fields.
+        Returns how many user documents were changed.
+        """
+        collection = self.get_collection()
+        migrated = 0
+        cursor = collection.find({"payment_details": {"$exists": True}}, projection={"payment_details": 1})
+        async for user in cursor:
+            payments = []
+            for detail in user.get("payment_details") or ():
+                paid_at = detail.get("date")
+                ts = int(paid_at.replace(tzinfo=timezone.utc).timestamp()) if isinstance(paid_at, datetime) else _now_ts()
+                payments.append(UpdateOne({"user_id": user["_id"], **detail}, {"$setOnInsert": {"ts": ts}}, upsert=True))
+            if payments:
+                await db_manager.payments.bulk_write(payments, ordered=False)
+            await collection.update_one({"_id": user["_id"]}, {"$unset": {"payment_details": ""}})
+            migrated += 1
+        return migrated
+
+    async def hash_password(self, password: str) -> str:
+        """Hash a password on the KDF thread pool"""
+        return await _run_kdf(_hash_password, password)
     
-    def hash_password(self, password: str) -> str:
-        """Hash a password"""
-        return pwd_context.hash(password)
-    
-    def verify_password(self, plain_password: str, hashed_password: str) -> bool:
-        """Verify a password against its hash"""
-        return pwd_context.verify(plain_password, hashed_password)
+    async def verify_password(self, plain_password: str, hashed_password: str) -> bool:
+        """Verify a password against its hash on the KDF thread pool"""
+        return await _run_kdf(_verify_password, plain_password, hashed_password)
     
     async def create_user(self, user: UserCreate) -> Dict[str, Any]:
         """Create a new user"""
         try:
             collection = self.get_collection()
             
-            # Check if user already exists
-            existing_user = collection.find_one({"email": user.email})
-            if existing_user:
+            # Without the unique index nothing else rejects a duplicate email
+            if not db_manager.email_index_ready and await collection.find_one({"email": _normalize_email(user.email)}, projection={"_id": 1}, collation=EMAIL_COLLATION):
                 raise ValueError("User with this email already exists")
             
             # Hash the password
-            hashed_password = self.hash_password(user.password)
+            hashed_password = await self.hash_password(user.password)
             
             # Prepare user document
+            now_ts = _now_ts()
             user_doc = {
-                "email": user.email,
+                "email": _normalize_email(user.email),
                 "full_name": user.full_name,
                 "phone": user.phone,
                 "password": hashed_password,
                 "is_active": True,
                 "subscription_type": "basic",
-                "subscription_expiry": None,
-                "last_plan_date": None,
+                "subscription_expiry_ts": None,
+                "last_plan_ts": None,
                 "plans_today": 0,
-                "payment_details": [],  # List to store payment history
-                "created_at": datetime.utcnow(),
-                "updated_at": datetime.utcnow()
+                "created_at_ts": now_ts,
+                "updated_at_ts": now_ts
             }
             
-            # Insert user
-            result = collection.insert_one(user_doc)
+            # Insert user (the unique email index rejects duplicates)
+            try:
+                result = await collection.insert_one(user_doc)
+            except DuplicateKeyError:
+                raise ValueError("User with this email already exists")
             
-            # Retrieve the created user
-            created_user = collection.find_one({"_id": result.inserted_id})
+            # Build the response from what we just wrote instead of re-reading it
+            user_doc["_id"] = result.inserted_id
             
-            return self._format_user_response(created_user)
+            return self._format_user_response(user_doc)
             
         except ValueError:
             raise
@@ -95,36 +317,70 @@ class UserCRUD:
         """Get user by email"""
         try:
             collection = self.get_collection()
-            user = collection.find_one({"email": email})
-            return self._format_user_response(user) if user else None
+            user = await collection.find_one({"email": _normalize_email(email)}, projection=_AUTH_PROJECTION, collation=EMAIL_COLLATION)
+            if not user:
+                return None
+            return self._format_user_response(user)
         except Exception as e:
             logger.error(f"Error getting user by email: {e}")
             return None
     
     async def get_user_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
         """Get user by ID"""
+        if not ObjectId.is_valid(user_id):
+            return None
         try:
             collection = self.get_collection()
-            user = collection.find_one({"_id": ObjectId(user_id)})
-            return self._format_user_response(user) if user else None
+            user = await collection.find_one({"_id": _oid(user_id)}, projection=_AUTH_PROJECTION)
+            if not user:
+                return None
+            return self._format_user_response(user)
         except Exception as e:
             logger.error(f"Error getting user by ID: {e}")
             return None
+
+    async def get_users_by_ids(self, user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Get several users in one query, keyed by id (unknown or invalid ids are left out)"""
+        oids = list({_oid(user_id) for user_id in user_ids if ObjectId.is_valid(user_id)})
+        if not oids:
+            return {}
+        try:
+            collection = self.get_collection()
+            cursor = collection.find({"_id": {"$in": oids}}, projection=_AUTH_PROJECTION).batch_size(len(oids))
+            users = {}
+            async for user in cursor:
+                formatted = self._format_user_response(user)
+                users[formatted["id"]] = formatted
+            return users
+        except Exception as e:
+            logger.error(f"Error getting users by IDs: {e}")
+            return {}
         
     async def authenticate_user(self, email: str, password: str) -> Optional[Dict[str, Any]]:
         """Authenticate user with email and password"""
         try:
             collection = self.get_collection()
-            user = collection.find_one({"email": email})
+            user = await collection.find_one({"email": _normalize_email(email)}, collation=EMAIL_COLLATION)
             
             if not user:
+                # Burn the same KDF time as a real check so a missing account
+                # is indistinguishable from a wrong password by timing
+                await self.verify_password(password, _DUMMY_HASH)
                 return None
             
-            if not self.verify_password(password, user["password"]):
+            valid, new_hash = await _run_kdf(_verify_and_update, password, user["password"])
+            if not valid:
                 return None
             
             if not user.get("is_active", False):
                 return None
+
+            # Upgrade legacy bcrypt hashes to the current scheme
+            if new_hash:
+                await collection.update_one(
+                    {"_id": user["_id"]},
+                    {"$set": {"password": new_hash}}
+                )
             
             return self._format_user_response(user)
             
@@ -132,8 +388,12 @@ class UserCRUD:
             logger.error(f"Error authenticating user: {e}")
             return None
     
-    async def update_user(self, user_id: str, user_update: UserUpdate) -> Optional[Dict[str, Any]]:
-        """Update user profile"""
+    async def update_user(self, user_id: str, user_update: UserUpdate, current_user: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Update user profile
+
+        ``current_user`` is the caller's already-resolved user; when nothing
+        changes it is returned as-is instead of re-reading the document.
+        """
         try:
             collection = self.get_collection()
             
@@ -146,21 +406,24 @@ class UserCRUD:
             
             if not update_data:
                 # No fields to update, return current user
+                if current_user is not None:
+                    return current_user
                 return await self.get_user_by_id(user_id)
             
-            update_data["updated_at"] = datetime.utcnow()
+            update_data["updated_at_ts"] = _now_ts()
             
-            # Update user
-            result = collection.update_one(
-                {"_id": ObjectId(user_id)},
-                {"$set": update_data}
+            # Update user and get the updated document back in the same round trip
+            user = await collection.find_one_and_update(
+                {"_id": _oid(user_id)},
+                {"$set": update_data},
+                projection=_AUTH_PROJECTION,
+                return_document=ReturnDocument.AFTER,
             )
             
-            if result.matched_count == 0:
+            if not user:
                 return None
             
-            # Return updated user
-            return await self.get_user_by_id(user_id)
+            return self._format_user_response(user)
             
         except Exception as e:
             logger.error(f"Error updating user: {e}")
@@ -172,24 +435,24 @@ class UserCRUD:
             collection = self.get_collection()
             
             # Get user with password
-            user = collection.find_one({"_id": ObjectId(user_id)})
+            user = await collection.find_one({"_id": _oid(user_id)})
             if not user:
                 return False
             
             # Verify current password
-            if not self.verify_password(current_password, user["password"]):
+            if not await self.verify_password(current_password, user["password"]):
                 return False
             
             # Hash new password
-            new_hashed_password = self.hash_password(new_password)
+            new_hashed_password = await self.hash_password(new_password)
             
             # Update password
-            result = collection.update_one(
-                {"_id": ObjectId(user_id)},
+            result = await collection.update_one(
+                {"_id": user["_id"]},
                 {
                     "$set": {
                         "password": new_hashed_password,
-                        "updated_at": datetime.utcnow()
+                        "updated_at_ts": _now_ts()
                     }
                 }
             )
@@ -205,12 +468,12 @@ class UserCRUD:
         try:
             collection = self.get_collection()
             
-            result = collection.update_one(
-                {"_id": ObjectId(user_id)},
+            result = await collection.update_one(
+                {"_id": _oid(user_id)},
                 {
                     "$set": {
                         "is_active": False,
-                        "updated_at": datetime.utcnow()
+                        "updated_at_ts": _now_ts()
                     }
                 }
             )
@@ -220,91 +483,97 @@ class UserCRUD:
         except Exception as e:
             logger.error(f"Error deactivating user: {e}")
             return False
-    async def check_can_generate_plan(self, user_id: str) -> bool:
-        """Check if user can generate a plan based on subscription and limits"""
+    async def consume_plan_generation(self, user_id: str) -> bool:
+        """Atomically check subscription/daily limit and reserve a plan generation.
+
+        A single pipeline update downgrades expired premium users, resets the
+        daily counter on a new day and, for basic users under the limit, counts
+        the generation. Denied attempts leave the counter untouched.
+        """
         try:
             collection = self.get_collection()
-            user = collection.find_one({"_id": ObjectId(user_id)})
-            if not user:
-                return False
+            now_ts = _now_ts()
+            today_start_ts = now_ts - now_ts % SECONDS_PER_DAY
 
-            now = datetime.utcnow()
-            subscription_type = user.get("subscription_type", "basic")
-            subscription_expiry = user.get("subscription_expiry")
-
-            # Check if premium and not expired
-            if subscription_type == "premium":
-                if subscription_expiry and subscription_expiry > now:
-                    return True
-                else:
-                    # Expire premium
-                    collection.update_one(
-                        {"_id": ObjectId(user_id)},
-                        {"$set": {"subscription_type": "basic", "subscription_expiry": None}}
-                    )
-                    subscription_type = "basic"
-
-            # For basic, check daily limit
-            if subscription_type == "basic":
-                last_plan_date = user.get("last_plan_date")
-                plans_today = user.get("plans_today", 0)
-                today = now.date()
-
-                if last_plan_date and last_plan_date.date() != today:
-                    # Reset count
-                    collection.update_one(
-                        {"_id": ObjectId(user_id)},
-                        {"$set": {"plans_today": 0, "last_plan_date": now}}
-                    )
-                    plans_today = 0 
-
-                return plans_today < 1
+            subscription_type = {"$ifNull": ["$subscription_type", "basic"]}
+            expired_premium = {
+                "$and": [
+                    {"$eq": [subscription_type, "premium"]},
+                    {"$not": [{"$gt": ["$subscription_expiry_ts", now_ts]}]},
+                ]
+            }
+            is_premium = {"$eq": ["$subscription_type", "premium"]}
+            plans_today = {
+                "$cond": [
+                    {"$lt": ["$last_plan_ts", today_start_ts]},
+                    0,
+                    {"$ifNull": ["$plans_today", 0]},
+                ]
+            }
+            reserve = {"$and": [{"$not": [is_premium]}, {"$lt": [plans_today, BASIC_DAILY_PLAN_LIMIT]}]}
 
-            return False
+            # The document before the update tells whether this call reserved a plan
+            before = await collection.find_one_and_update(
+                {"_id": _oid(user_id)},
+                [
+                    {"$set": {
+                        "subscription_type": {"$cond": [expired_premium, "basic", subscription_type]},
+                        "subscription_expiry_ts": {"$cond": [expired_premium, None, "$subscription_expiry_ts"]},
+                    }},
+                    {"$set": {
+                        "plans_today": {"$cond": [reserve, {"$add": [plans_today, 1]}, {"$ifNull": ["$plans_today", 0]}]},
+                        "last_plan_ts": {"$cond": [reserve, now_ts, "$last_plan_ts"]},
+                    }},
+                ],
+                projection={"subscription_type": 1, "subscription_expiry_ts": 1, "plans_today": 1, "last_plan_ts": 1},
+                return_document=ReturnDocument.BEFORE,
+            )
+            if not before:
+                return False
+
+            # Same decision the pipeline made, from the pre-update values
+            expiry_ts = before.get("subscription_expiry_ts")
+            if before.get("subscription_type") == "premium" and expiry_ts is not None and expiry_ts > now_ts:
+                return True
+            last_plan_ts = before.get("last_plan_ts")
+            used_today = 0 if last_plan_ts is None or last_plan_ts < today_start_ts else (before.get("plans_today") or 0)
+            return used_today < BASIC_DAILY_PLAN_LIMIT
 
         except Exception as e:
             logger.error(f"Error checking plan generation: {e}")
             return False
 
-    async def update_plan_generation(self, user_id: str):
-        """Update plan generation count after successful generation"""
+    async def refund_plan_generation(self, user_id: str):
+        """Give back a reserved plan generation when generation fails"""
         try:
             collection = self.get_collection()
-            user = collection.find_one({"_id": ObjectId(user_id)})
-            if not user:
-                return
-
-            now = datetime.utcnow()
-            subscription_type = user.get("subscription_type", "basic")
-
-            if subscription_type == "basic":
-                collection.update_one(
-                    {"_id": ObjectId(user_id)},
-                    {
-                        "$set": {"last_plan_date": now},
-                        "$inc": {"plans_today": 1}
-                    }
-                )
+            await collection.update_one(
+                {"_id": _oid(user_id), "subscription_type": "basic", "plans_today": {"$gt": 0}},
+                {"$inc": {"plans_today": -1}}
+            )
 
         except Exception as e:
-            logger.error(f"Error updating plan generation: {e}")
+            logger.error(f"Error refunding plan generation: {e}")
 
     async def upgrade_to_premium(self, user_id: str, payment_detail: dict):
         """Upgrade user to premium for 30 days and store payment detail"""
         try:
             collection = self.get_collection()
-            now = datetime.utcnow()
-            expiry = now + timedelta(days=30)
+            now_ts = _now_ts()
+            expiry_ts = now_ts + PREMIUM_PERIOD_SECONDS
+            user_oid = _oid(user_id)
 
-            collection.update_one(
-                {"_id": ObjectId(user_id)},
+            # Payments live in their own collection so user documents stay small
+            await db_manager.payments.insert_one({"user_id": user_oid, **payment_detail, "ts": now_ts})
+
+            await collection.update_one(
+                {"_id": user_oid},
                 {
                     "$set": {
                         "subscription_type": "premium",
-                        "subscription_expiry": expiry,
-                        "updated_at": now
-                    },
-                    "$push": {"payment_details": payment_detail}
+                        "subscription_expiry_ts": expiry_ts,
+                        "updated_at_ts": now_ts
+                    }
                 }
             )
 
@@ -1,37 +1,69 @@
-from pymongo import MongoClient
-from pymongo.database import Database
-from pymongo.collection import Collection
-from config import settings
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection, AsyncIOMotorDatabase
+from config import get_settings
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# users.email is unique and looked up case-insensitively; queries on it must pass
+# this collation to match (and use) the index
+EMAIL_COLLATION = {"locale": "en", "strength": 2}
+
 class DatabaseManager:
     def __init__(self):
-        self.client: MongoClient = None
-        self.database: Database = None
+        self.client: AsyncIOMotorClient = None
+        self.database: AsyncIOMotorDatabase = None
+        # Collection handles bound once on connect
+        self.users: AsyncIOMotorCollection = None
+        self.payments: AsyncIOMotorCollection = None
+        # App bookkeeping, e.g. which one-off data migrations have completed
+        self.meta: AsyncIOMotorCollection = None
+        # Whether the unique users.email index exists; CRUD falls back to a pre-check if not
+        self.email_index_ready = False
         
     async def connect(self):
         """Connect to MongoDB Atlas"""
         try:
-            self.client = MongoClient(settings.mongodb_uri)
+            settings = get_settings()
+            self.client = AsyncIOMotorClient(settings.mongodb_uri, maxPoolSize=50)
             # Test the connection
-            self.client.admin.command('ping')
+            await self.client.admin.command('ping')
             self.database = self.client[settings.database_name]
+            self.users = self.database["users"]
+            self.payments = self.database["payments"]
+            self.meta = self.database["meta"]
+            await self.ensure_indexes()
             logger.info("Successfully connected to MongoDB Atlas")
         except Exception as e:
             logger.error(f"Failed to connect to MongoDB: {e}")
             raise e
     
+    async def ensure_indexes(self):
+        """Create indexes the CRUD layer relies on (no-op if they already exist)"""
+        # Uniqueness of user emails is enforced here rather than by a pre-check
+        try:
+            await self.users.create_index("email", unique=True, collation=EMAIL_COLLATION, name="email_ci_unique")
+            self.email_index_ready = True
+        except Exception as e:
+            self.email_index_ready = False
+            logger.error(f"Could not create unique index on users.email, checking emails before insert instead: {e}")
+        try:
+            await self.payments.create_index([("user_id", 1), ("ts", -1)])
+        except Exception as e:
+            logger.warning(f"Could not create index on payments.user_id: {e}")
+
     async def close(self):
         """Close MongoDB connection"""
         if self.client:
             self.client.close()
+            self.users = None
+            self.payments = None
+            self.meta = None
+            self.email_index_ready = False
             logger.info("MongoDB connection closed")
     
-    def get_collection(self, collection_name: str) -> Collection:
+    def get_collection(self, collection_name: str) -> AsyncIOMotorCollection:
         """Get a collection from the database"""
         if self.database is None:
             raise Exception("Database not connected")
@@ -40,12 +72,12 @@ class DatabaseManager:
 # Create global database manager instance
 db_manager = DatabaseManager()
 
-# These functions are kept for backward compatibility but now work synchronously
-async def get_database() -> Database:
+# These functions are kept for backward compatibility
+async def get_database() -> AsyncIOMotorDatabase:
     """Get database instance"""
     return db_manager.database
 
-async def get_collection(collection_name: str) -> Collection:
+async def get_collection(collection_name: str) -> AsyncIOMotorCollection:
     """Get collection instance"""
     return db_manager.get_collection(collection_name)
 
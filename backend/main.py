@@ -1,11 +1,16 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
+import asyncio
 import logging
 
 # Import routers
 from routers import auth, flights, plans
 from routers import agentic as agentic_router
+from crud import calibrate_password_hashing, shutdown_kdf_pool, user_crud
+from config import get_settings
+from src.agentic_agents.crew_coordinator import flush_search_history
 
 # Import database manager (make sure this exists)
 try:
@@ -26,6 +31,11 @@ async def lifespan(app: FastAPI):
     """Application lifespan manager"""
     # Startup
     logger.info("Starting up TripCraft Backend...")
+
+    target_ms = get_settings().password_hash_target_ms
+    if target_ms:
+        time_cost = await asyncio.to_thread(calibrate_password_hashing, target_ms)
+        logger.info(f"Password hashing calibrated to argon2 time_cost={time_cost}")
     
     if db_manager:
         try:
@@ -33,40 +43,42 @@ async def lifespan(app: FastAPI):
             logger.info("Connected to MongoDB Atlas")
         except Exception as e:
             logger.error(f"Failed to connect to database: {e}")
+        else:
+            try:
+                await user_crud.run_migrations()
+            except Exception as e:
+                logger.error(f"Error running data migrations: {e}")
     
     yield
     
     # Shutdown
     logger.info("Shutting down TripCraft Backend...")
     if db_manager:
+        # Queued agentic search history still needs the connection
+        await flush_search_history()
         try:
             await db_manager.close()
             logger.info("Disconnected from MongoDB Atlas")
         except Exception as e:
             logger.error(f"Error disconnecting from database: {e}")
 
+    shutdown_kdf_pool()
+
 # Create FastAPI app
 app = FastAPI(
     title="TripCraft Backend API",
     description="Backend API for TripCraft travel application with user authentication and flight search",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=[
-        "http://localhost:3000",
-        "http://localhost:5173",
-        "http://localhost:8080",
-        "http://localhost:8005",
-        "http://127.0.0.1:3000",
-        "http://127.0.0.1:5173",
-        "http://127.0.0.1:3915",
-        "http://127.0.0.1:8005",
-        # Add your frontend URL here if different
-    ],
+    # Any local dev frontend (localhost / 127.0.0.1 on any port); compiled once by Starlette.
+    # Extend the alternation if your frontend is served from another host.
+    allow_origin_regex=r"^https?://(localhost|127\.0\.0\.1)(:\d+)?$",
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
@@ -78,6 +90,7 @@ app.include_router(flights.router, prefix="/api/v1", tags=["flights"])
 app.include_router(plans.router, prefix="/api/v1", tags=["travel-planning"])
 app.include_router(agentic_router.router, prefix="/api/v1", tags=["agentic"])
 
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -128,7 +141,7 @@ async def not_found_handler(request, exc):
 
 if __name__ == "__main__":
     import uvicorn
-    from config import settings
+    settings = get_settings()
     
     logger.info(f"Starting server on {settings.host}:{settings.port}")
     uvicorn.run(
@@ -0,0 +1,89 @@
+"""
+Premium analytics for hotel search results
+"""
+
+from typing import List, Optional
+
+
+def _to_float(value) -> Optional[float]:
+    """float(value), skipping the conversion for numbers and returning None on bad input"""
+    cls = value.__class__
+    if cls is float:
+        return value
+    if cls is int:
+        return float(value)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def compute_premium_features(hotels: List[dict]) -> dict:
+    """Chain diversity, price and location analytics in a single pass over hotels"""
+    chains = set()
+    pmin = pmax = dmin = dmax = None
+    psum = dsum = 0.0
+    pn = dn = 0
+
+    for hotel in hotels:
+        h = hotel.get("hotel") or {}
+        chain = h.get("chainCode")
+        if chain:
+            chains.add(chain)
+
+        distance = (h.get("distance") or {}).get("value")
+        if distance:
+            d = _to_float(distance)
+            if d is not None:
+                dsum += d
+                dn += 1
+                if dmin is None or d < dmin:
+                    dmin = d
+                if dmax is None or d > dmax:
+                    dmax = d
+
+        if offers := hotel.get("offers"):
+            price = (offers[0].get("price") or {}).get("total")
+            if price:
+                p = _to_float(price)
+                if p is not None:
+                    psum += p
+                    pn += 1
+                    if pmin is None or p < pmin:
+                        pmin = p
+                    if pmax is None or p > pmax:
+                        pmax = p
+
+    chain_diversity = {
+        "unique_chains": len(chains),
+        "diversity_score": min(len(chains) / 5.0, 1.0),  # Normalized to 0-1
+        "chains_found": list(chains)
+    }
+
+    if pn:
+        price_analysis = {
+            "min_price": pmin,
+            "max_price": pmax,
+            "avg_price": psum / pn,
+            "price_range": pmax - pmin,
+            "total_options": pn
+        }
+    else:
+        price_analysis = {"analysis": "No price data available"}
+
+    if dn:
+        avg_distance = dsum / dn
+        location_insights = {
+            "avg_distance_km": avg_distance,
+            "closest_hotel_km": dmin,
+            "farthest_hotel_km": dmax,
+            "central_location_score": max(0, 1 - avg_distance / 10)  # 0-1 score
+        }
+    else:
+        location_insights = {"analysis": "No distance data available"}
+
+    return {
+        "chain_diversity_score": chain_diversity,
+        "price_analysis": price_analysis,
+        "location_insights": location_insights
+    }
@@ -1,6 +1,7 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
 from pydantic import BaseModel, Field
 from typing import Any, Dict, Optional
+from datetime import date
 from src.agentic_agents.crew_coordinator import TravelCrewCoordinator
 
 
@@ -10,8 +11,8 @@ router = APIRouter()
 class TravelRequest(BaseModel):
     origin: str = Field(..., description="IATA code or city name")
     destination: str = Field(..., description="IATA code or city name")
-    departure_date: str = Field(..., description="YYYY-MM-DD")
-    return_date: Optional[str] = Field(None, description="YYYY-MM-DD")
+    departure_date: date = Field(..., description="YYYY-MM-DD")
+    return_date: Optional[date] = Field(None, description="YYYY-MM-DD")
     travelers: int = Field(1, ge=1, le=9)
     budget: Optional[float] = Field(None, ge=0)
     currency: str = Field("USD")
@@ -19,10 +20,12 @@ class TravelRequest(BaseModel):
 
 
 @router.post("/agentic/estimate-travel-cost")
-async def agentic_estimate_travel_cost(request: TravelRequest):
+async def agentic_estimate_travel_cost(request: TravelRequest, background_tasks: BackgroundTasks):
     try:
         coordinator = TravelCrewCoordinator()
-        result = await coordinator.execute_travel_analysis(request.model_dump())
+        # Dates are validated by pydantic and dumped back to ISO strings for the coordinator;
+        # search history is written after the response is sent
+        result = await coordinator.execute_travel_analysis(request.model_dump(mode="json"), background_tasks=background_tasks)
         return {"status": "ok", "result": result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -7,10 +7,9 @@ from models import (
 )
 from auth import create_access_token, get_current_active_user
 from crud import user_crud
-from config import settings
+from config import get_settings
 import logging
 from typing import Union, Optional, Dict, Any
-from jose import JWTError, jwt
 
 
 logger = logging.getLogger(__name__)
@@ -54,7 +53,7 @@ async def login_user(user_credentials: UserLogin):
             )
         
         # Create access token
-        access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
+        access_token_expires = timedelta(minutes=get_settings().access_token_expire_minutes)
         access_token = create_access_token(
             data={"sub": user["email"]}, 
             expires_delta=access_token_expires
@@ -91,7 +90,8 @@ async def update_user_profile(
         # Use the 'id' field instead of '_id'
         updated_user = await user_crud.update_user(
             current_user["id"], 
-            user_update
+            user_update,
+            current_user=current_user
         )
         
         if not updated_user:
@@ -1,31 +1,47 @@
 from fastapi import APIRouter, HTTPException, Depends, Query
 from typing import Optional
-from services.amadeus_service import search_flights, get_airport_autocomplete
+from datetime import date
+import asyncio
+from services.amadeus_service import search_flights_async, get_airport_autocomplete_async
+from utils.cache import TTLCache
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+def _maybe_iata(s: str) -> Optional[str]:
+    """Return s as an uppercase IATA code if it looks like one, else None"""
+    if len(s) == 3 and s.isascii() and s.isalpha():
+        return s if s.isupper() else s.upper()
+    return None
+
 @router.get("/flights/search")
 async def flight_search(
     origin: str = Query(..., min_length=1),
     destination: str = Query(..., min_length=1),
-    departure_date: str = Query(..., regex=r"\d{4}-\d{2}-\d{2}"),
-    return_date: Optional[str] = Query(None, regex=r"\d{4}-\d{2}-\d{2}"),
+    departure_date: date = Query(..., description="YYYY-MM-DD"),
+    return_date: Optional[date] = Query(None, description="YYYY-MM-DD"),
     adults: int = Query(1, ge=1, le=9)
 ):
     try:
-        # Convert city names to IATA codes if needed
-        origin_code = origin if len(origin) == 3 else await get_iata_code_from_city(origin)
-        destination_code = destination if len(destination) == 3 else await get_iata_code_from_city(destination)
+        # Convert city names to IATA codes if needed; both lookups run at once
+        origin_code, destination_code = await asyncio.gather(
+            _resolve_iata(origin), _resolve_iata(destination)
+        )
         
         if not origin_code:
             raise HTTPException(status_code=400, detail=f"Could not find airport code for origin: {origin}")
         if not destination_code:
             raise HTTPException(status_code=400, detail=f"Could not find airport code for destination: {destination}")
         
-        results = search_flights(origin_code, destination_code, departure_date, return_date, adults)
+        results = await search_flights_async(
+            origin_code,
+            destination_code,
+            departure_date.isoformat(),
+            return_date.isoformat() if return_date else None,
+            adults,
+        )
         return results
     except Exception as e:
         logger.error(f"Flight search error: {e}")
@@ -34,20 +50,35 @@ async def flight_search(
 @router.get("/flights/airports")
 async def airport_autocomplete(keyword: str = Query(..., min_length=1)):
     try:
-        results = get_airport_autocomplete(keyword)
+        results = await get_airport_autocomplete_async(keyword)
         return results
     except Exception as e:
         logger.error(f"Airport autocomplete error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _resolve_iata(value: str) -> Optional[str]:
+    """Use value directly if it is already an IATA code, else look it up"""
+    return _maybe_iata(value) or await get_iata_code_from_city(value)
+
+# City -> IATA mappings are effectively static; hits skip the worker-thread hop entirely
+_iata_cache = TTLCache(maxsize=2048, ttl=7 * 86400)
+
 async def get_iata_code_from_city(city_name: str):
     """Helper function to get IATA code from city name"""
+    cache_key = city_name.strip().lower()
+    cached = _iata_cache.get(cache_key)
+    if cached is not None:
+        return cached
     try:
         # Get airport suggestions for the city name
-        suggestions = get_airport_autocomplete(city_name)
-        if suggestions and len(suggestions) > 0:
+        suggestions = await get_airport_autocomplete_async(city_name)
+        # Errors come back as {"error": ...}; only a non-empty list has suggestions
+        if isinstance(suggestions, list) and suggestions:
             # Return the IATA code of the first suggestion
-            return suggestions[0].get('iataCode')
+            code = suggestions[0].get('iataCode')
+            if code:
+                _iata_cache.set(cache_key, code)
+            return code
         return None
     except Exception as e:
         logger.error(f"Error getting IATA code for city {city_name}: {e}")
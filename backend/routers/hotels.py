@@ -1,86 +1,71 @@
 from fastapi import APIRouter, HTTPException, Query, Depends
-from typing import Optional, List
+from fastapi.concurrency import run_in_threadpool
+from typing import Optional
 from services.serpapi_hotels_service import (
     SerpApiClient,
     map_serp_properties_to_hotel_offers,
 )
-from services.nlp_service import extract_hotel_preferences, sanitize_user_input
 from services.llm_summary_service import summarize_hotel_search_results
-from services.security_service import validate_hotel_search_input
+from services.security_service import validate_and_extract
 from services.city_name_service import get_city_display_name
 from services.currency_service import is_direct_supported, fetch_conversion_rate
 from auth import get_current_active_user
+from utils.cache import TTLCache
+from routers._hotel_analytics import compute_premium_features
 from fastapi import Security
+import asyncio
 import logging
+import re
+from datetime import datetime
+from functools import lru_cache
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-def _calculate_chain_diversity(hotels: List[dict]) -> dict:
-    """Calculate hotel chain diversity score"""
-    chains = set()
-    for hotel in hotels:
-        chain = hotel.get("hotel", {}).get("chainCode")
-        if chain:
-            chains.add(chain)
-    
-    return {
-        "unique_chains": len(chains),
-        "diversity_score": min(len(chains) / 5.0, 1.0),  # Normalized to 0-1
-        "chains_found": list(chains)
-    }
+_DATE_RE = re.compile(r"\A\d{4}-\d{2}-\d{2}\Z")
 
-def _analyze_price_range(hotels: List[dict]) -> dict:
-    """Analyze price distribution"""
-    prices = []
-    for hotel in hotels:
-        offers = hotel.get("offers", [])
-        if offers:
-            price = offers[0].get("price", {}).get("total")
-            if price:
-                try:
-                    prices.append(float(price))
-                except ValueError:
-                    pass
-    
-    if not prices:
-        return {"analysis": "No price data available"}
-    
-    return {
-        "min_price": min(prices),
-        "max_price": max(prices),
-        "avg_price": sum(prices) / len(prices),
-        "price_range": max(prices) - min(prices),
-        "total_options": len(prices)
-    }
+def _validate_date(value: str, name: str) -> str:
+    """Reject anything that is not a real YYYY-MM-DD calendar date"""
+    if not _DATE_RE.match(value):
+        raise HTTPException(status_code=400, detail=f"Invalid {name}: expected YYYY-MM-DD")
+    try:
+        datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name}: {value} is not a valid date")
+    return value
 
-def _generate_location_insights(hotels: List[dict]) -> dict:
-    """Generate location-based insights"""
-    distances = []
-    for hotel in hotels:
-        distance = hotel.get("hotel", {}).get("distance", {}).get("value")
-        if distance:
-            try:
-                distances.append(float(distance))
-            except ValueError:
-                pass
-    
-    if not distances:
-        return {"analysis": "No distance data available"}
-    
-    return {
-        "avg_distance_km": sum(distances) / len(distances),
-        "closest_hotel_km": min(distances),
-        "farthest_hotel_km": max(distances),
-        "central_location_score": max(0, 1 - (sum(distances) / len(distances)) / 10)  # 0-1 score
-    }
+# Dependencies are async so FastAPI runs them inline instead of hopping to the threadpool
+async def _check_in_date(check_in: str = Query(..., description="YYYY-MM-DD")) -> str:
+    return _validate_date(check_in, "check_in")
+
+async def _check_out_date(check_out: str = Query(..., description="YYYY-MM-DD")) -> str:
+    return _validate_date(check_out, "check_out")
+
+async def _no_user() -> None:
+    return None
+
+# SerpApi expects lowercase booleans
+_TRUE = "true"
+_FALSE = "false"
+
+@lru_cache(maxsize=1)
+def _serp_client() -> SerpApiClient:
+    """One client per process so the SerpApi connection pool is shared across requests"""
+    return SerpApiClient()
+
+# Autocomplete suggestions keyed by normalized keyword; prefixes repeat a lot
+_autocomplete_cache = TTLCache(maxsize=4096, ttl=3600)
 
 @router.get("/hotels/locations")
 async def hotel_locations(keyword: str = Query(..., min_length=1)):
     """Get location autocomplete for hotel search (SerpApi Google Hotels Autocomplete)"""
     try:
-        client = SerpApiClient()
-        raw = client.hotels_autocomplete(keyword)
+        cache_key = keyword.strip().lower()
+        cached = _autocomplete_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        raw = await run_in_threadpool(_serp_client().hotels_autocomplete, keyword)
         # Filter to accommodation-focused suggestions only
         cleaned = []
         for s in raw.get("suggestions", []):
@@ -97,7 +82,10 @@ async def hotel_locations(keyword: str = Query(..., min_length=1)):
                         "location": s.get("location"),
                         "property_token": s.get("property_token"),
                     })
-        return cleaned[:8]
+        cleaned = cleaned[:8]
+        if not raw.get("error"):
+            _autocomplete_cache.set(cache_key, cleaned)
+        return cleaned
     except Exception as e:
         logger.error(f"Location autocomplete error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -105,8 +93,8 @@ async def hotel_locations(keyword: str = Query(..., min_length=1)):
 @router.get("/hotels/search")
 async def hotel_search(
     destination: str = Query(..., description="Destination text for Google Hotels 'q' (e.g., 'Bali Resorts' or 'New York hotels')"),
-    check_in: str = Query(..., regex=r"\d{4}-\d{2}-\d{2}"),
-    check_out: str = Query(..., regex=r"\d{4}-\d{2}-\d{2}"),
+    check_in: str = Depends(_check_in_date),
+    check_out: str = Depends(_check_out_date),
     adults: int = Query(2, ge=1, le=9),
     room_quantity: int = Query(1, ge=1, le=9),
     max_hotels: int = Query(20, ge=1, le=50),
@@ -126,7 +114,7 @@ async def hotel_search(
     brands: Optional[str] = Query(None, description="brand ids comma-separated"),
     vacation_rentals: Optional[bool] = None,
     next_page_token: Optional[str] = None,
-    current_user = Depends(lambda: None)
+    current_user = Depends(_no_user)
 ):
     """
     Enhanced hotel search with NLP, IR, LLM, and security features
@@ -138,102 +126,103 @@ async def hotel_search(
     - Security: Input validation and sanitization
     - Auth: Premium features require authentication
     """
+    fx_task = None
+    summary_task = None
     try:
-        # Input validation and sanitization
-        search_params = {
-            'destination': destination,
-            'check_in': check_in,
-            'check_out': check_out,
-            'adults': adults,
-            'room_quantity': room_quantity,
-            'max_hotels': max_hotels,
-            'currency': currency,
-            'preferences': preferences
-        }
-        
-        validated_params = validate_hotel_search_input(search_params)
-        
-        # Sanitize preferences text
-        sanitized_preferences = None
-        if preferences:
-            sanitized_preferences = sanitize_user_input(preferences)
-        
-        # NLP: Extract preferences from natural language
-        extracted_preferences = {}
-        if sanitized_preferences:
-            extracted_preferences = extract_hotel_preferences(sanitized_preferences)
+        # Validation, sanitization and NLP preference extraction in one pass
+        ctx = validate_and_extract(
+            destination=destination,
+            check_in=check_in,
+            check_out=check_out,
+            adults=adults,
+            room_quantity=room_quantity,
+            max_hotels=max_hotels,
+            currency=currency,
+            preferences=preferences,
+        )
+        extracted_preferences = ctx.extracted
+        if extracted_preferences:
             logger.info(f"Extracted preferences: {extracted_preferences}")
         
         # Build SerpApi params using destination as free-text q
-        client = SerpApiClient()
         serp_params = {
-            "q": validated_params['destination'],
-            "check_in_date": validated_params['check_in'],
-            "check_out_date": validated_params['check_out'],
-            "adults": adults,
-            "currency": currency if is_direct_supported(currency) else "USD",
+            "q": ctx.destination,
+            "check_in_date": ctx.check_in,
+            "check_out_date": ctx.check_out,
+            "adults": ctx.adults,
+            "currency": ctx.currency if is_direct_supported(ctx.currency) else "USD",
         }
-        # Map extracted preferences where possible
-        if sort_by is not None:
-            serp_params["sort_by"] = sort_by
-        if min_price is not None:
-            serp_params["min_price"] = min_price
-        if max_price is not None:
-            serp_params["max_price"] = max_price
-        if rating is not None:
-            serp_params["rating"] = rating
-        if hotel_class is not None:
-            serp_params["hotel_class"] = hotel_class
-        if free_cancellation is not None:
-            serp_params["free_cancellation"] = str(bool(free_cancellation)).lower()
-        if eco_certified is not None:
-            serp_params["eco_certified"] = str(bool(eco_certified)).lower()
-        if amenities:
-            serp_params["amenities"] = amenities
-        if property_types:
-            serp_params["property_types"] = property_types
-        if brands:
-            serp_params["brands"] = brands
-        if vacation_rentals is not None:
-            serp_params["vacation_rentals"] = str(bool(vacation_rentals)).lower()
-        if next_page_token:
-            serp_params["next_page_token"] = next_page_token
+        # Optional SerpApi filters; empty strings are dropped by the client
+        for key, value in (
+            ("sort_by", sort_by),
+            ("min_price", min_price),
+            ("max_price", max_price),
+            ("rating", rating),
+            ("hotel_class", hotel_class),
+            ("amenities", amenities),
+            ("property_types", property_types),
+            ("brands", brands),
+            ("next_page_token", next_page_token),
+        ):
+            if value is not None:
+                serp_params[key] = value
+        for key, flag in (
+            ("free_cancellation", free_cancellation),
+            ("eco_certified", eco_certified),
+            ("vacation_rentals", vacation_rentals),
+        ):
+            if flag is not None:
+                serp_params[key] = _TRUE if flag else _FALSE
+
+        # The FX rate doesn't depend on the results, so fetch it alongside the search
+        if not is_direct_supported(ctx.currency):
+            fx_task = asyncio.create_task(
+                run_in_threadpool(fetch_conversion_rate, serp_params["currency"], ctx.currency)
+            )
 
-        raw = client.hotels_search(serp_params)
+        raw = await run_in_threadpool(_serp_client().hotels_search, serp_params)
         if not isinstance(raw, dict):
             raise HTTPException(status_code=502, detail="Invalid response from SerpApi")
         if raw.get("error"):
             code = int(raw.get("status_code") or 502)
             raise HTTPException(status_code=code, detail=str(raw.get("error")))
         properties = raw.get("properties") or []
-        mapped = map_serp_properties_to_hotel_offers(properties, validated_params['check_in'], validated_params['check_out'], serp_params["currency"], guests=adults, rooms=room_quantity)
+        mapped = map_serp_properties_to_hotel_offers(properties, ctx.check_in, ctx.check_out, serp_params["currency"], guests=ctx.adults, rooms=ctx.room_quantity)
+        # Only the first max_hotels are returned; everything downstream works on that slice
+        visible = mapped[:ctx.max_hotels]
+
+        # LLM: Start the summary as soon as the visible hotels are known; it only reads the
+        # source prices, so it overlaps the FX conversion and the rest of the response assembly
+        if include_summary and visible:
+            summary_task = asyncio.create_task(
+                run_in_threadpool(summarize_hotel_search_results, visible, extracted_preferences)
+            )
 
         # If requested currency not directly supported, convert totals
-        if not is_direct_supported(currency) and mapped:
-            rate = fetch_conversion_rate(serp_params["currency"], currency)
-            for m in mapped:
-                if m.get("offers"):
-                    o = m["offers"][0]
-                    try:
-                        total = float(o["price"]["total"])
-                        converted = round(total * rate, 2)
-                        o["price"]["converted_total"] = converted
-                        o["price"]["converted_currency"] = currency
-                        o["price"]["conversion_rate"] = rate
-                    except Exception:
-                        pass
-        
-        # LLM: Generate summary if requested
-        summary = None
-        if include_summary and mapped:
-            summary = summarize_hotel_search_results(mapped, extracted_preferences)
+        if fx_task is not None and visible:
+            rate = await fx_task
+            target = ctx.currency
+            for m in visible:
+                offers = m.get("offers")
+                if not offers:
+                    continue
+                price = offers[0].get("price")
+                try:
+                    total = price["total"]
+                    if type(total) is not float:
+                        total = float(total)
+                except (KeyError, TypeError, ValueError):
+                    continue
+                price["converted_total"] = round(total * rate, 2)
+                price["converted_currency"] = target
+                price["conversion_rate"] = rate
         
         # Prepare response with metadata
         response = {
-            "hotels": mapped[:max_hotels],
+            "hotels": visible,
             "search_metadata": {
-                "destination": validated_params['destination'],
-                "destination_display": validated_params['destination'],
+                "destination": ctx.destination,
+                "destination_display": ctx.destination,
                 "total_results": len(mapped),
                 "preferences_applied": extracted_preferences,
                 "source": "SerpApi Google Hotels",
@@ -249,17 +238,20 @@ async def hotel_search(
                 "next_page_token": raw["serpapi_pagination"]["next_page_token"]
             }
         
+        # Premium analytics overlap with the in-flight LLM summary
+        premium_features = None
+        if current_user and premium_search:
+            premium_features = await run_in_threadpool(compute_premium_features, visible)
+
         # Add summary if generated
-        if summary:
-            response["ai_summary"] = summary
+        if summary_task is not None:
+            summary = await summary_task
+            if summary:
+                response["ai_summary"] = summary
         
         # Add premium features for authenticated users
-        if current_user and premium_search:
-            response["premium_features"] = {
-                "chain_diversity_score": _calculate_chain_diversity(mapped),
-                "price_analysis": _analyze_price_range(mapped),
-                "location_insights": _generate_location_insights(mapped)
-            }
+        if premium_features is not None:
+            response["premium_features"] = premium_features
         
         return response
         
@@ -270,6 +262,11 @@ async def hotel_search(
     except Exception as e:
         logger.error(f"Hotel search error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # Lookups left unawaited (failed or empty search, later errors) must not outlive the request
+        for task in (fx_task, summary_task):
+            if task is not None and not task.done():
+                task.cancel()
 
 @router.get("/hotels/list")
 async def list_hotels(
@@ -278,8 +275,7 @@ async def list_hotels(
 ):
     """List hotels by destination keyword (without pricing details)"""
     try:
-        client = SerpApiClient()
-        raw = client.hotels_search({
+        raw = await run_in_threadpool(_serp_client().hotels_search, {
             "q": destination,
             # Provide dummy 1-night date window to get properties list
             "check_in_date": "2025-09-26",
@@ -298,14 +294,13 @@ async def list_hotels(
 async def hotel_details(
     property_token: str = Query(..., description="SerpApi property_token"),
     destination: str = Query(..., description="Pass same 'q' as search"),
-    check_in: str = Query(..., regex=r"\d{4}-\d{2}-\d{2}"),
-    check_out: str = Query(..., regex=r"\d{4}-\d{2}-\d{2}"),
+    check_in: str = Depends(_check_in_date),
+    check_out: str = Depends(_check_out_date),
     adults: int = Query(2, ge=1, le=9),
     currency: str = Query("USD")
 ):
     try:
-        client = SerpApiClient()
-        raw = client.hotel_property_details({
+        raw = await run_in_threadpool(_serp_client().hotel_property_details, {
             "q": destination,
             "check_in_date": check_in,
             "check_out_date": check_out,
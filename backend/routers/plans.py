@@ -1,11 +1,14 @@
 from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from typing import List, Optional
 import logging
+import orjson
 from datetime import datetime, timedelta
 
 # Import your grok utility (make sure this path is correct)
-from utils.grok_api import ask_grok
+from utils.grok_api import ask_grok, stream_grok
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -14,10 +17,26 @@ logger = logging.getLogger(__name__)
 
 #import Auth and crud
 from auth import get_current_active_user
-from crud import user_crud
+from crud import user_crud, has_active_premium
 
 router = APIRouter()
 
+PLANNER_SYSTEM_ROLE = (
+    "You are a professional travel planner assistant. Provide detailed, practical travel itineraries "
+    "with specific recommendations for accommodations, activities, transportation, and budgets. "
+    "Include estimated costs, timing, and helpful tips. Format your response clearly with "
+    "day-by-day breakdowns, cost estimates, and practical advice."
+)
+
+PLAN_OUTPUT_INSTRUCTIONS = (
+    " Please provide a detailed day-by-day itinerary with estimated costs, "
+    "recommended accommodations, transportation options, and must-visit attractions. "
+    "Format the response in a clear, easy-to-read structure."
+)
+
+# Seconds an identical plan prompt keeps returning the cached LLM answer
+PLAN_CACHE_TTL = 86400
+
 class TravelQuery(BaseModel):
     destination: str = Field(..., description="Travel destination")
     origin:str=Field(..., description="Travel origin")
@@ -37,6 +56,50 @@ class TravelPlanResponse(BaseModel):
     query: str
     answer: str
 
+async def reserve_plan_generation(current_user: dict) -> bool:
+    """Check the daily plan limit; True when a generation was reserved and must be refunded on failure"""
+    # Active premium users have no daily limit, so skip the DB round-trip for them.
+    # Everyone else reserves today's generation atomically (which also downgrades
+    # an expired premium subscription).
+    if has_active_premium(current_user):
+        return False
+    can_generate = await user_crud.consume_plan_generation(current_user['id'])
+    if not can_generate:
+        raise HTTPException(status_code=403, detail="Daily limit reached or subscription expired. Upgrade to premium for unlimited access.")
+    return True
+
+def build_plan_query(travel_query: TravelQuery) -> str:
+    """Render the planner prompt for a trip request"""
+    # Build the user query prompt
+    parts = [
+        f"Plan a {travel_query.nights}-night trip from {travel_query.origin} to {travel_query.destination} "
+        f"for {travel_query.num_travelers} people with a total budget of "
+        f"{travel_query.total_budget} {travel_query.currency}."
+    ]
+    
+    # Add preferences if provided
+    if travel_query.preferences:
+        parts.append(f" Preferences include: {', '.join(travel_query.preferences)}.")
+    
+    # Add number of suggestions
+    parts.append(f" Suggest {travel_query.suggestions} possible itinerary/itineraries.")
+    
+    # Add optional preferences
+    if travel_query.transport:
+        parts.append(f" Preferred transport: {travel_query.transport}.")
+    if travel_query.accommodation:
+        parts.append(f" Accommodation type: {travel_query.accommodation}.")
+    if travel_query.meal:
+        parts.append(f" Meal preference: {travel_query.meal}.")
+    if travel_query.activities:
+        parts.append(f" Activity preferences: {travel_query.activities}.")
+    if travel_query.language:
+        parts.append(f" Language preference: {travel_query.language}.")
+    
+    # Add additional instructions for better output
+    parts.append(PLAN_OUTPUT_INSTRUCTIONS)
+    return "".join(parts)
+
 @router.post("/generate-travel-plan", response_model=TravelPlanResponse)
 async def generate_travel_plan(
     travel_query: TravelQuery,
@@ -44,78 +107,91 @@ async def generate_travel_plan(
     """
     Generate a travel plan using AI based on user preferences
     """
+    plan_reserved = False
     try:
         logger.info(f"Received travel query for destination: {travel_query.destination} from user: {current_user['email']}")      
 
-        # Check subscription and daily limits
-        can_generate = await user_crud.check_can_generate_plan(current_user['id'])
-        if not can_generate:
-            raise HTTPException(status_code=403, detail="Daily limit reached or subscription expired. Upgrade to premium for unlimited access.")
+        plan_reserved = await reserve_plan_generation(current_user)
 
-
-        # Build the user query prompt
-        query = (
-            f"Plan a {travel_query.nights}-night trip from {travel_query.origin} to {travel_query.destination} "
-            f"for {travel_query.num_travelers} people with a total budget of "
-            f"{travel_query.total_budget} {travel_query.currency}."
-        )
-        
-        # Add preferences if provided
-        if travel_query.preferences:
-            query += f" Preferences include: {', '.join(travel_query.preferences)}."
-        
-        # Add number of suggestions
-        query += f" Suggest {travel_query.suggestions} possible itinerary/itineraries."
-        
-        # Add optional preferences
-        if travel_query.transport:
-            query += f" Preferred transport: {travel_query.transport}."
-        if travel_query.accommodation:
-            query += f" Accommodation type: {travel_query.accommodation}."
-        if travel_query.meal:
-            query += f" Meal preference: {travel_query.meal}."
-        if travel_query.activities:
-            query += f" Activity preferences: {travel_query.activities}."
-        if travel_query.language:
-            query += f" Language preference: {travel_query.language}."
-        
-        # Add additional instructions for better output
-        query += (
-            " Please provide a detailed day-by-day itinerary with estimated costs, "
-            "recommended accommodations, transportation options, and must-visit attractions. "
-            "Format the response in a clear, easy-to-read structure."
-        )
+        query = build_plan_query(travel_query)
         
         logger.info(f"Generated query: {query}")
         
-        # Call Grok API
-        system_role = (
-            "You are a professional travel planner assistant. Provide detailed, practical travel itineraries "
-            "with specific recommendations for accommodations, activities, transportation, and budgets. "
-            "Include estimated costs, timing, and helpful tips. Format your response clearly with "
-            "day-by-day breakdowns, cost estimates, and practical advice."
-        )
-        
-        answer = ask_grok(query, system_role=system_role)
+        # Call Grok API (blocking HTTP, so keep it off the event loop)
+        # Identical trip requests reuse the earlier answer for a day
+        answer = await run_in_threadpool(ask_grok, query, system_role=PLANNER_SYSTEM_ROLE, cache_ttl=PLAN_CACHE_TTL)
         
         if not answer:
             raise HTTPException(status_code=500, detail="No response generated from AI service")
         
-        # Update user's plan generation count
-        await user_crud.update_plan_generation(current_user['id'])
-        
         logger.info("Successfully generated travel plan")
         
         return TravelPlanResponse(query=query, answer=answer)
     
     except Exception as e:
         logger.error(f"Error in generate_travel_plan: {str(e)}")
+        if plan_reserved:
+            await user_crud.refund_plan_generation(current_user['id'])
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, 
             detail=f"Failed to generate travel plan: {str(e)}"
             
         )
 
+@router.post("/generate-travel-plan/stream")
+async def stream_travel_plan(
+    travel_query: TravelQuery,
+    current_user: dict = Depends(get_current_active_user)):
+    """
+    Generate a travel plan like /generate-travel-plan, streamed as server-sent events
+
+    Each event is {"content": "..."}; a failure after streaming started ends the
+    stream with an "error" event. A stream that does not finish refunds the plan.
+    """
+    plan_reserved = False
+    try:
+        logger.info(f"Received streaming travel query for destination: {travel_query.destination} from user: {current_user['email']}")
+        plan_reserved = await reserve_plan_generation(current_user)
+        query = build_plan_query(travel_query)
+        
+        # Pull the first chunk before answering, so a failed request still gets an error status
+        chunks = stream_grok(query, system_role=PLANNER_SYSTEM_ROLE, cache_ttl=PLAN_CACHE_TTL)
+        first = await run_in_threadpool(next, chunks, None)
+        if first is None:
+            raise HTTPException(status_code=500, detail="No response generated from AI service")
+    
+    except Exception as e:
+        logger.error(f"Error in stream_travel_plan: {str(e)}")
+        if plan_reserved:
+            await user_crud.refund_plan_generation(current_user['id'])
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, 
+            detail=f"Failed to generate travel plan: {str(e)}"
+        )
+    
+    async def events():
+        finished = False
+        try:
+            yield b"data: " + orjson.dumps({"content": first}) + b"\n\n"
+            # The Grok stream is blocking HTTP; each chunk is read in the threadpool
+            async for chunk in iterate_in_threadpool(chunks):
+                yield b"data: " + orjson.dumps({"content": chunk}) + b"\n\n"
+            finished = True
+        except Exception as e:
+            logger.error(f"Error while streaming travel plan: {str(e)}")
+            yield b"event: error\ndata: " + orjson.dumps({"detail": "Travel plan stream interrupted"}) + b"\n\n"
+        finally:
+            # Closing the Grok generator releases its pooled connection (also on client disconnect)
+            try:
+                chunks.close()
+            except ValueError:
+                # Still running in the threadpool; it is closed when garbage collected
+                pass
+            if plan_reserved and not finished:
+                await user_crud.refund_plan_generation(current_user['id'])
+    
+    return StreamingResponse(events(), media_type="text/event-stream")
+
 @router.get("/health")
 async def plans_health():
     """Health check endpoint for plans router"""
@@ -2,26 +2,25 @@
 from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.responses import JSONResponse
 import stripe
-from config import settings
+from config import get_settings
 from auth import get_current_active_user
 from crud import user_crud
 import logging
-from datetime import datetime
+from datetime import datetime, timezone
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-# Set Stripe API key
-stripe.api_key = settings.stripe_secret_key
-
 @router.post("/subscribe")
 async def create_checkout_session(current_user: dict = Depends(get_current_active_user)):
     """Create Stripe checkout session for premium subscription"""
     try:
         logger.info(f"Creating checkout session for user: {current_user['email']}")
+        settings = get_settings()
         # Create checkout session
         session = stripe.checkout.Session.create(
+            api_key=settings.stripe_secret_key,
             payment_method_types=['card'],
             line_items=[
                 {
@@ -43,19 +42,19 @@ async def create_checkout_session(current_user: dict = Depends(get_current_activ
     except Exception as e:
         logger.error(f"Error creating checkout session: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to create checkout session: {str(e)}")
-    except Exception as e:
-        logger.error(f"Error creating checkout session: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/subscription/webhook")
 async def stripe_webhook(request: Request):
     """Handle Stripe webhook events"""
-    payload = await request.body()
+    # Unsigned requests can never verify; reject them before reading the body
     sig_header = request.headers.get('stripe-signature')
+    if not sig_header:
+        raise HTTPException(status_code=400, detail="Missing signature")
+    payload = await request.body()
     
     try:
         event = stripe.Webhook.construct_event(
-            payload, sig_header, settings.web_hook_secret
+            payload, sig_header, get_settings().web_hook_secret
         )
     except ValueError as e:
         # Invalid payload
@@ -67,13 +66,13 @@ async def stripe_webhook(request: Request):
     # Handle the event
     if event['type'] == 'checkout.session.completed':
         session = event['data']['object']
-        user_id = session['metadata'].get('user_id')
+        user_id = (session.get('metadata') or {}).get('user_id')
         if user_id:
             payment_detail = {
                 "payment_id": session.get("payment_intent") or session.get("id"),
                 "amount": session.get("amount_total", 0) / 100,
                 "currency": session.get("currency", "usd").upper(),
-                "date": datetime.utcnow(),
+                "date": datetime.now(timezone.utc),
                 "status": "completed",
             }
             await user_crud.upgrade_to_premium(user_id, payment_detail)
@@ -1,19 +1,59 @@
 # backend/services/amadeus_service.py
 from amadeus import Client, ResponseError
 from dotenv import load_dotenv
+import asyncio
+import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+
+from config import get_settings
+from utils.cache import PersistentTTLCache, SingleFlight
 
 load_dotenv() # Load environment variables
 
+logger = logging.getLogger(__name__)
+
 AMADEUS_CLIENT_ID = os.getenv("AMADEUS_CLIENT_ID")
 AMADEUS_CLIENT_SECRET = os.getenv("AMADEUS_CLIENT_SECRET")
 
+# One client per process; it caches the OAuth access token until it expires
 amadeus = Client(
     client_id=AMADEUS_CLIENT_ID,
     client_secret=AMADEUS_CLIENT_SECRET,
     hostname="test"
 )
 
+# City/airport lookups barely change; keep them for a day, keyed by normalized keyword.
+# Keywords with no matches are remembered briefly so typed-out prefixes don't re-query.
+# Both are persisted to SQLite so a restart doesn't re-pay every common prefix.
+# The default file lives in an app-owned directory, not the shared temp dir.
+_DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache")
+_EMPTY_RESULT_TTL = 600
+# Concurrent lookups of the same uncached keyword share one Amadeus call
+_autocomplete_flight = SingleFlight()
+
+# Hotel offer lookups are split into small hotelIds batches fetched side by side;
+# the SDK is blocking, so the batches run on a shared thread pool.
+_OFFERS_BATCH_SIZE = 5
+_offers_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="amadeus-offers")
+
+def _amadeus_cache_path() -> str:
+    path = get_settings().amadeus_cache_path
+    if path:
+        return path
+    os.makedirs(_DEFAULT_CACHE_DIR, mode=0o700, exist_ok=True)
+    return os.path.join(_DEFAULT_CACHE_DIR, "amadeus-cache.sqlite3")
+
+@lru_cache(maxsize=None)
+def _autocomplete_cache(table: str) -> PersistentTTLCache:
+    """Autocomplete cache for one lookup kind, opened on first use"""
+    return PersistentTTLCache(maxsize=10_000, ttl=86400, path=_amadeus_cache_path(), table=table)
+
+def _keyword_key(keyword: str) -> str:
+    return " ".join(keyword.split()).lower()
+
 def search_flights(origin: str, destination: str, departure_date: str, return_date: str = None, adults: int = 1):
     """
     Searches for flight offers using the Amadeus Flight Offers Search API.
@@ -48,6 +88,13 @@ def get_airport_autocomplete(keyword: str):
     Provides airport/city autocomplete suggestions using the Amadeus Airport & City Search API.
     Prioritizes cities over airports for better user experience.
     """
+    cache_key = _keyword_key(keyword)
+    cached = _autocomplete_cache("airport_autocomplete").get(cache_key)
+    if cached is not None:
+        return cached
+    return _autocomplete_flight.do(("airport", cache_key), _fetch_airport_autocomplete, keyword, cache_key)
+
+def _fetch_airport_autocomplete(keyword: str, cache_key: str):
     try:
         response = amadeus.reference_data.locations.get(
             keyword=keyword,
@@ -61,8 +108,12 @@ def get_airport_autocomplete(keyword: str):
             airports = [item for item in response.data if item.get('subType') == 'AIRPORT']
             
             # Return cities first, then airports
-            return cities + airports
+            result = cities + airports
+            _autocomplete_cache("airport_autocomplete").set(cache_key, result)
+            return result
         
+        if response.data is not None:
+            _autocomplete_cache("airport_autocomplete").set(cache_key, response.data, ttl=_EMPTY_RESULT_TTL)
         return response.data
     except ResponseError as error:
         print(f"Amadeus API Error: {error}")
@@ -72,11 +123,22 @@ def get_location_autocomplete(keyword: str):
     """
     Provides city/location autocomplete suggestions for hotel search using the Amadeus Airport & City Search API.
     """
+    cache_key = _keyword_key(keyword)
+    cached = _autocomplete_cache("location_autocomplete").get(cache_key)
+    if cached is not None:
+        return cached
+    return _autocomplete_flight.do(("location", cache_key), _fetch_location_autocomplete, keyword, cache_key)
+
+def _fetch_location_autocomplete(keyword: str, cache_key: str):
     try:
         response = amadeus.reference_data.locations.get(
             keyword=keyword,
             subType=['CITY']
         )
+        if response.data:
+            _autocomplete_cache("location_autocomplete").set(cache_key, response.data)
+        elif response.data is not None:
+            _autocomplete_cache("location_autocomplete").set(cache_key, response.data, ttl=_EMPTY_RESULT_TTL)
         return response.data
     except ResponseError as error:
         print(f"Amadeus API Error: {error}")
@@ -104,17 +166,8 @@ def get_hotel_offers(hotel_ids: list, check_in: str, check_out: str, adults: int
     Get hotel offers using Amadeus Hotel Search API (v3)
     """
     try:
-        # This requires a separate client for v3 API
-        from amadeus import Client as AmadeusClient
-        
-        amadeus_v3 = AmadeusClient(
-            client_id=AMADEUS_CLIENT_ID,
-            client_secret=AMADEUS_CLIENT_SECRET,
-            hostname="test"
-        )
-        
-        # Use the correct API structure for hotel offers
-        response = amadeus_v3.shopping.hotel_offers_search.get(
+        # Reuse the module client: its cached OAuth token is shared across calls
+        response = amadeus.shopping.hotel_offers_search.get(
             hotelIds=hotel_ids,
             checkInDate=check_in,
             checkOutDate=check_out,
@@ -127,6 +180,30 @@ def get_hotel_offers(hotel_ids: list, check_in: str, check_out: str, adults: int
         print(f"Amadeus Hotel Offers API Error: {error}")
         return {"error": str(error)}
 
+def _get_hotel_offers_batched(hotel_ids: list, check_in: str, check_out: str, adults: int, room_quantity: int, currency: str):
+    """
+    Fetch offers for hotel_ids in parallel batches and merge them in id order.
+    Returns the first error only if no batch produced offers.
+    """
+    if len(hotel_ids) <= _OFFERS_BATCH_SIZE:
+        return get_hotel_offers(hotel_ids, check_in, check_out, adults, room_quantity, currency)
+    
+    batches = [hotel_ids[i:i + _OFFERS_BATCH_SIZE] for i in range(0, len(hotel_ids), _OFFERS_BATCH_SIZE)]
+    results = _offers_pool.map(
+        lambda ids: get_hotel_offers(ids, check_in, check_out, adults, room_quantity, currency),
+        batches,
+    )
+    offers = []
+    first_error = None
+    for result in results:
+        if isinstance(result, dict) and "error" in result:
+            first_error = first_error or result
+        elif result:
+            offers.extend(result)
+    if not offers and first_error is not None:
+        return first_error
+    return offers
+
 def get_hotels_by_geocode(latitude: float, longitude: float, radius: int = 5, ratings: list = None, amenities: list = None):
     """
     Get hotel list by geocode using Amadeus Hotel List API (v1)
@@ -144,6 +221,40 @@ def get_hotels_by_geocode(latitude: float, longitude: float, radius: int = 5, ra
         print(f"Amadeus Hotel Geocode API Error: {error}")
         return {"error": str(error)}
 
+def _city_geocode(city_code: str):
+    """(latitude, longitude) of an IATA city code from the cached location lookup, or None"""
+    locations = get_location_autocomplete(city_code)
+    if not isinstance(locations, list):
+        return None
+    for location in locations:
+        geo = location.get("geoCode")
+        if location.get("iataCode") == city_code.upper() and geo:
+            return geo.get("latitude"), geo.get("longitude")
+    return None
+
+def _get_hotels_by_city_geocode(city_code: str, radius: int, ratings: list, amenities: list):
+    geo = _city_geocode(city_code)
+    if geo is None or None in geo:
+        return []
+    return get_hotels_by_geocode(geo[0], geo[1], radius, ratings, amenities)
+
+def _get_hotels_for_city(city_code: str, radius: int, ratings: list, amenities: list):
+    """
+    List hotels by city code; only when that fails or comes back empty, list them
+    around the city's coordinates instead. Returns (hotels, search_type).
+    """
+    hotels = get_hotels_by_city(city_code, radius, ratings, amenities)
+    if hotels and not (isinstance(hotels, dict) and "error" in hotels):
+        return hotels, "city_based"
+    try:
+        fallback = _get_hotels_by_city_geocode(city_code, radius, ratings, amenities)
+    except Exception as e:
+        logger.warning(f"Amadeus geocode hotel fallback failed: {e}")
+        fallback = None
+    if fallback and isinstance(fallback, list):
+        return fallback, "geocode_based"
+    return hotels, "city_based"
+
 def search_hotels_with_offers(city_code: str, check_in: str, check_out: str, adults: int = 1, room_quantity: int = 1, max_hotels: int = 10, currency: str = "USD", radius: int = 5, ratings: list = None, amenities: list = None):
     """
     Combined search: Get hotels by city, then get offers for top hotels
@@ -151,7 +262,7 @@ def search_hotels_with_offers(city_code: str, check_in: str, check_out: str, adu
     """
     try:
         # Step 1: Get hotel list with preferences
-        hotels = get_hotels_by_city(city_code, radius, ratings, amenities)
+        hotels, search_type = _get_hotels_for_city(city_code, radius, ratings, amenities)
         if isinstance(hotels, dict) and "error" in hotels:
             return hotels
             
@@ -167,24 +278,31 @@ def search_hotels_with_offers(city_code: str, check_in: str, check_out: str, adu
         hotels_sorted = sorted(hotels, key=sort_key)
         
         # Step 3: Get hotel IDs (limit to max_hotels)
-        hotel_ids = [hotel["hotelId"] for hotel in hotels_sorted[:max_hotels]]
+        # Index by id once: duplicate listings collapse and offers join in O(1)
+        hotels_by_id = {}
+        for hotel in hotels_sorted:
+            hotels_by_id.setdefault(hotel["hotelId"], hotel)
+        hotel_ids = list(hotels_by_id)[:max_hotels]
         
         # Step 4: Get offers for these hotels
-        offers = get_hotel_offers(hotel_ids, check_in, check_out, adults, room_quantity, currency)
+        offers = _get_hotel_offers_batched(hotel_ids, check_in, check_out, adults, room_quantity, currency)
         if isinstance(offers, dict) and "error" in offers:
             return offers
+        if not offers:
+            return []
             
         # Step 5: Combine hotel info with offers and add price breakdown
+        nights = _nights_between(check_in, check_out)
         result = []
         for offer in offers:
             if offer.get("available", False):
-                hotel_info = next((h for h in hotels_sorted if h["hotelId"] == offer["hotel"]["hotelId"]), {})
+                hotel_info = hotels_by_id.get(offer["hotel"]["hotelId"], {})
                 
                 # Calculate price breakdown for each offer
                 enhanced_offers = []
                 for hotel_offer in offer["offers"]:
                     price_breakdown = _calculate_price_breakdown(
-                        hotel_offer, adults, room_quantity, check_in, check_out
+                        hotel_offer, adults, room_quantity, nights
                     )
                     enhanced_offer = {
                         **hotel_offer,
@@ -200,7 +318,7 @@ def search_hotels_with_offers(city_code: str, check_in: str, check_out: str, adu
                     "offers": enhanced_offers,
                     "available": offer["available"],
                     "search_metadata": {
-                        "search_type": "city_based",
+                        "search_type": search_type,
                         "radius_km": radius,
                         "preferences_applied": {
                             "ratings": ratings or [],
@@ -215,7 +333,37 @@ def search_hotels_with_offers(city_code: str, check_in: str, check_out: str, adu
         print(f"Combined hotel search error: {e}")
         return {"error": str(e)}
 
-def _calculate_price_breakdown(offer, adults, room_quantity, check_in, check_out):
+# Async entry points for route handlers. The Amadeus SDK is blocking, so each
+# call runs in a worker thread and the event loop keeps serving other requests.
+# The calls are pure network waits, so they get their own wide pool instead of
+# competing with CPU-bound to_thread work for the small default executor.
+_amadeus_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="amadeus")
+
+async def _run_blocking(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(_amadeus_pool, func, *args)
+
+async def search_flights_async(origin: str, destination: str, departure_date: str, return_date: str = None, adults: int = 1):
+    return await _run_blocking(search_flights, origin, destination, departure_date, return_date, adults)
+
+async def get_airport_autocomplete_async(keyword: str):
+    return await _run_blocking(get_airport_autocomplete, keyword)
+
+async def get_location_autocomplete_async(keyword: str):
+    return await _run_blocking(get_location_autocomplete, keyword)
+
+async def search_hotels_with_offers_async(city_code: str, check_in: str, check_out: str, adults: int = 1, room_quantity: int = 1, max_hotels: int = 10, currency: str = "USD", radius: int = 5, ratings: list = None, amenities: list = None):
+    return await _run_blocking(
+        search_hotels_with_offers, city_code, check_in, check_out, adults, room_quantity, max_hotels, currency, radius, ratings, amenities
+    )
+
+def _nights_between(check_in: str, check_out: str):
+    """Number of nights between two YYYY-MM-DD dates, or None if either is malformed"""
+    try:
+        return (datetime.strptime(check_out, '%Y-%m-%d') - datetime.strptime(check_in, '%Y-%m-%d')).days
+    except (TypeError, ValueError):
+        return None
+
+def _calculate_price_breakdown(offer, adults, room_quantity, nights):
     """
     Calculate detailed price breakdown for hotel offer
     
@@ -223,19 +371,14 @@ def _calculate_price_breakdown(offer, adults, room_quantity, check_in, check_out
         offer: Hotel offer data from Amadeus
         adults: Number of adults
         room_quantity: Number of rooms
-        check_in: Check-in date
-        check_out: Check-out date
+        nights: Length of stay, parsed once per search by _nights_between
         
     Returns:
         Dictionary with price breakdown details
     """
     try:
-        from datetime import datetime
-        
-        # Parse dates to calculate nights
-        check_in_date = datetime.strptime(check_in, '%Y-%m-%d')
-        check_out_date = datetime.strptime(check_out, '%Y-%m-%d')
-        nights = (check_out_date - check_in_date).days
+        if nights is None:
+            raise ValueError("Invalid check-in/check-out dates")
         
         price_data = offer.get("price", {})
         total = float(price_data.get("total", 0))
@@ -283,18 +426,18 @@ def _generate_price_explanation(adults, rooms, nights, total, per_room_rate, cur
     if nights == 0:
         return f"Total: {currency} {total}"
     
-    explanation = f"Total for {nights} night{'s' if nights > 1 else ''}: {currency} {total}"
+    parts = [f"Total for {nights} night{'s' if nights > 1 else ''}: {currency} {total}"]
     
     if rooms > 1:
-        explanation += f" ({rooms} rooms × {currency} {per_room_rate:.2f} per room per night)"
+        parts.append(f" ({rooms} rooms × {currency} {per_room_rate:.2f} per room per night)")
     else:
-        explanation += f" ({currency} {per_room_rate:.2f} per night)"
+        parts.append(f" ({currency} {per_room_rate:.2f} per night)")
     
     if adults > 2:
-        explanation += f" for {adults} adults"
+        parts.append(f" for {adults} adults")
     elif adults == 2:
-        explanation += f" for 2 adults"
+        parts.append(" for 2 adults")
     else:
-        explanation += f" for 1 adult"
+        parts.append(" for 1 adult")
     
-    return explanation
\ No newline at end of file
+    return "".join(parts)
\ No newline at end of file
@@ -183,7 +183,8 @@ def get_city_display_name(iata_code: str) -> str:
     Returns:
         Human-readable city name or original code if not found
     """
-    return CITY_NAME_MAPPINGS.get(iata_code.upper(), iata_code.upper())
+    code = iata_code.upper()
+    return CITY_NAME_MAPPINGS.get(code, code)
 
 def get_city_info(iata_code: str) -> Dict[str, str]:
     """
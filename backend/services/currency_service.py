@@ -1,28 +1,52 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+from utils.cache import TTLCache
 
-SUPPORTED_DIRECT = {
+
+SUPPORTED_DIRECT = frozenset({
     # Commonly supported by Google Hotels. Extend as needed.
     'USD', 'EUR', 'GBP', 'INR', 'AUD', 'CAD', 'MYR'
-}
+})
+
+# exchangerate.host publishes slow-moving rates; reuse a fetched rate for an hour
+_rate_cache = TTLCache(maxsize=256, ttl=3600)
+
+# Keep-alive connections to the FX API, with a couple of quick retries on transient failures
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=20,
+    max_retries=Retry(total=2, backoff_factor=0.2),
+))
 
 
 def is_direct_supported(code: str) -> bool:
-    return code.upper() in SUPPORTED_DIRECT
+    # Codes are usually already uppercase (validated upstream); only normalize when not
+    return code in SUPPORTED_DIRECT or code.upper() in SUPPORTED_DIRECT
 
 
 def fetch_conversion_rate(from_code: str, to_code: str) -> float:
     """Fetch FX rate using exchangerate.host. Returns multiplier to convert from -> to.
-    Falls back to 1.0 on error.
+    Falls back to 1.0 on error. Successful lookups are cached for an hour.
     """
+    key = (from_code.upper(), to_code.upper())
+    if key[0] == key[1]:
+        return 1.0
+    cached = _rate_cache.get(key)
+    if cached is not None:
+        return cached
     try:
-        url = f"https://api.exchangerate.host/convert?from={from_code.upper()}&to={to_code.upper()}"
-        resp = requests.get(url, timeout=10)
+        url = f"https://api.exchangerate.host/convert?from={key[0]}&to={key[1]}"
+        resp = _session.get(url, timeout=10)
         if resp.status_code == 200:
             data = resp.json()
             result = data.get('result')
             if isinstance(result, (int, float)) and result > 0:
-                return float(result)
+                rate = float(result)
+                _rate_cache.set(key, rate)
+                return rate
     except Exception:
         pass
     return 1.0
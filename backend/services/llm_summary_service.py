@@ -10,21 +10,52 @@ from utils.grok_api import ask_grok
 
 logger = logging.getLogger(__name__)
 
+# Seconds an identical hotel summary prompt keeps returning the cached answer
+SUMMARY_CACHE_TTL = 1800
+
+# Static prompt text, built once at import instead of per request. All fixed
+# instructions live in the system prompt; the user prompt carries only the
+# hotel list and preferences.
+HOTEL_SUMMARY_SYSTEM_PROMPT = """You are a professional travel advisor specializing in hotel recommendations.
+Your task is to provide clear, concise, and helpful summaries of hotel search results.
+
+Guidelines:
+1. Highlight the best value options
+2. Mention key amenities and features
+3. Note any special considerations (location, cancellation policies)
+4. Keep summaries under 200 words
+5. Use a friendly, professional tone
+6. Focus on practical information travelers need
+
+Format your response as follows:
+
+**Quick Overview:** (2-3 sentences about the best options)
+
+**Best Options:**
+• Hotel 1: Price - Key features
+• Hotel 2: Price - Key features
+
+**Key Considerations:**
+• Point 1
+• Point 2
+
+**Value Recommendations:**
+• Recommendation 1
+• Recommendation 2
+
+**Important Notes:**
+• Note 1
+• Note 2
+
+Keep the summary concise, practical, and easy to scan. Use bullet points and clear formatting."""
+
+SUMMARY_PROMPT_HEADER = "Summarize these hotel search results:\n"
+
 class HotelSummaryGenerator:
     """Generate intelligent summaries of hotel search results using LLM"""
     
     def __init__(self):
-        self.system_prompt = """You are a professional travel advisor specializing in hotel recommendations. 
-        Your task is to provide clear, concise, and helpful summaries of hotel search results.
-        
-        Guidelines:
-        1. Highlight the best value options
-        2. Mention key amenities and features
-        3. Note any special considerations (location, cancellation policies)
-        4. Keep summaries under 200 words
-        5. Use a friendly, professional tone
-        6. Focus on practical information travelers need
-        """
+        self.system_prompt = HOTEL_SUMMARY_SYSTEM_PROMPT
     
     def summarize_hotel_results(self, hotels: List[Dict[str, Any]], user_preferences: Dict[str, List[str]] = None) -> str:
         """
@@ -64,7 +95,9 @@ class HotelSummaryGenerator:
         prompt = self._create_summary_prompt(hotel_summary_data, user_preferences)
         
         try:
-            summary = ask_grok(prompt, system_role=self.system_prompt)
+            # The prompt is a canonical rendering of the top hotels and preferences, so
+            # identical result sets (pagination, re-renders) reuse the earlier summary
+            summary = ask_grok(prompt, system_role=self.system_prompt, cache_ttl=SUMMARY_CACHE_TTL)
             return summary or "Unable to generate summary at this time."
         except Exception as e:
             logger.error(f"Error generating hotel summary: {e}")
@@ -73,68 +106,44 @@ class HotelSummaryGenerator:
     def _create_summary_prompt(self, hotels: List[Dict], preferences: Dict[str, List[str]]) -> str:
         """Create a prompt for LLM summarization"""
         
-        hotel_list = ""
+        lines = []
         for i, hotel in enumerate(hotels, 1):
-            hotel_list += f"{i}. {hotel['name']} - {hotel['price']}"
+            distance = ""
             if hotel['distance'] != 'N/A':
-                hotel_list += f" ({hotel['distance']}{hotel['distance_unit']} from city center)"
-            hotel_list += f" - {hotel['cancellation']} cancellation\n"
+                distance = f" ({hotel['distance']}{hotel['distance_unit']} from city center)"
+            lines.append(f"{i}. {hotel['name']} - {hotel['price']}{distance} - {hotel['cancellation']} cancellation\n")
+        hotel_list = "".join(lines)
         
         preferences_text = ""
         if preferences:
-            preferences_text = "\nUser Preferences: "
+            parts = ["\nUser Preferences: "]
             if preferences.get("amenities"):
-                preferences_text += f"Amenities: {', '.join(preferences['amenities'])}. "
+                parts.append(f"Amenities: {', '.join(preferences['amenities'])}. ")
             if preferences.get("ratings"):
-                preferences_text += f"Star Rating: {', '.join(preferences['ratings'])}. "
+                parts.append(f"Star Rating: {', '.join(preferences['ratings'])}. ")
             if preferences.get("chains"):
-                preferences_text += f"Hotel Chains: {', '.join(preferences['chains'])}. "
+                parts.append(f"Hotel Chains: {', '.join(preferences['chains'])}. ")
+            preferences_text = "".join(parts)
         
-        prompt = f"""Please provide a helpful summary of these hotel search results in a clean, easy-to-read format:
-
-{hotel_list}{preferences_text}
-
-Please format your response as follows:
-
-**Quick Overview:** (2-3 sentences about the best options)
-
-**Best Options:**
-• Hotel 1: Price - Key features
-• Hotel 2: Price - Key features
-
-**Key Considerations:**
-• Point 1
-• Point 2
-
-**Value Recommendations:**
-• Recommendation 1
-• Recommendation 2
-
-**Important Notes:**
-• Note 1
-• Note 2
-
-Keep the summary concise, practical, and easy to scan. Use bullet points and clear formatting."""
-
-        return prompt
+        return "".join((SUMMARY_PROMPT_HEADER, hotel_list, preferences_text))
     
     def _fallback_summary(self, hotels: List[Dict]) -> str:
         """Generate a basic summary without LLM"""
         if not hotels:
             return "No hotels found."
         
-        summary = f"Found {len(hotels)} hotel options:\n\n"
+        parts = [f"Found {len(hotels)} hotel options:\n\n"]
         
         for i, hotel in enumerate(hotels[:3], 1):
-            summary += f"{i}. {hotel['name']} - {hotel['price']}"
+            parts.append(f"{i}. {hotel['name']} - {hotel['price']}")
             if hotel['distance'] != 'N/A':
-                summary += f" ({hotel['distance']}{hotel['distance_unit']} from center)"
-            summary += "\n"
+                parts.append(f" ({hotel['distance']}{hotel['distance_unit']} from center)")
+            parts.append("\n")
         
         if len(hotels) > 3:
-            summary += f"\n... and {len(hotels) - 3} more options available."
+            parts.append(f"\n... and {len(hotels) - 3} more options available.")
         
-        return summary
+        return "".join(parts)
 
 def summarize_hotel_search_results(hotels: List[Dict[str, Any]], user_preferences: Dict[str, List[str]] = None) -> str:
     """
@@ -147,5 +156,6 @@ def summarize_hotel_search_results(hotels: List[Dict[str, Any]], user_preference
     Returns:
         Summary text
     """
-    generator = HotelSummaryGenerator()
-    return generator.summarize_hotel_results(hotels, user_preferences)
+    return _generator.summarize_hotel_results(hotels, user_preferences)
+
+_generator = HotelSummaryGenerator()
@@ -5,6 +5,7 @@ Uses regex-based approach for better Windows compatibility
 """
 
 import re
+from functools import lru_cache
 from typing import List, Dict, Set, Optional
 import logging
 
@@ -53,6 +54,60 @@ RATING_PATTERNS = {
     r"\bpremium\b": "4"
 }
 
+# Additional patterns for common amenity variations
+EXTRA_AMENITY_PATTERNS = {
+    r'\bpool\b': "SWIMMING_POOL",
+    r'\bworkout\b': "FITNESS_CENTER",
+    r'\bexercise\b': "FITNESS_CENTER",
+    r'\bfree\s+wifi\b': "WIFI",
+    r'\binternet\b': "WIFI",
+    r'\bwireless\b': "WIFI",
+    r'\bpark\b': "PARKING",
+    r'\bvalet\b': "VALET_PARKING"
+}
+
+# Common city patterns
+CITY_PATTERNS = [
+    r'\bin\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)\b',  # "in Paris", "in New York"
+    r'\bnear\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)\b',  # "near London"
+    r'\b([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)\s+area\b',  # "Paris area"
+]
+
+# Known major cities (matched against lowercased text)
+MAJOR_CITIES = [
+    'paris', 'london', 'new york', 'tokyo', 'sydney', 'dubai', 'singapore',
+    'berlin', 'rome', 'madrid', 'barcelona', 'amsterdam', 'vienna', 'prague',
+    'budapest', 'warsaw', 'moscow', 'istanbul', 'cairo', 'cape town',
+    'rio de janeiro', 'buenos aires', 'mexico city', 'toronto', 'vancouver',
+    'san francisco', 'los angeles', 'chicago', 'miami', 'boston', 'seattle'
+]
+
+# Common hotel chain patterns
+CHAIN_PATTERNS = [
+    r"\bmarriott\b", r"\bhyatt\b", r"\bhilton\b", r"\bihg\b",
+    r"\baccor\b", r"\bwyndham\b", r"\bchoice\b", r"\bradisson\b",
+    r"\bintercontinental\b", r"\bfour\s*seasons\b", r"\britz\b",
+    r"\bsheraton\b", r"\bwestin\b", r"\bnovotel\b", r"\bmercure\b"
+]
+
+# Compiled once at import; the extractor runs on every hotel search
+# All amenity keywords and variations in one alternation, scanned in a single pass.
+# Each alternative is its own capture group (lastindex -> code); the zero-width
+# lookahead lets matches that start at different positions overlap.
+_AMENITY_ALTERNATIVES = [(r'\b' + re.escape(k) + r'\b', v) for k, v in AMADEUS_AMENITIES.items()]
+_AMENITY_ALTERNATIVES += list(EXTRA_AMENITY_PATTERNS.items())
+_AMENITY_SCANNER = re.compile("(?=" + "|".join(f"({p})" for p, _ in _AMENITY_ALTERNATIVES) + ")")
+_AMENITY_CODES = [code for _, code in _AMENITY_ALTERNATIVES]
+_RATING_REGEXES = [(re.compile(p), r) for p, r in RATING_PATTERNS.items()]
+_CITY_REGEXES = [re.compile(p) for p in CITY_PATTERNS]
+# Longest names first so a multi-word city wins over any shorter prefix
+_MAJOR_CITIES_RE = re.compile(
+    r'\b(' + '|'.join(re.escape(c) for c in sorted(MAJOR_CITIES, key=len, reverse=True)) + r')\b'
+)
+_CHAIN_REGEXES = [re.compile(p) for p in CHAIN_PATTERNS]
+# Characters sanitize_user_input removes, deleted in one C-level pass
+_STRIP_TABLE = str.maketrans('', '', '<>"\'')
+
 class HotelPreferenceExtractor:
     """Extract hotel preferences from natural language input"""
     
@@ -89,89 +144,39 @@ class HotelPreferenceExtractor:
     
     def _extract_amenities(self, text: str) -> List[str]:
         """Extract amenities from text using regex patterns"""
-        amenities = []
-        
-        # Check for exact matches and variations
-        for amenity_key, amenity_code in AMADEUS_AMENITIES.items():
-            # Create pattern for the amenity (with word boundaries)
-            pattern = r'\b' + re.escape(amenity_key) + r'\b'
-            if re.search(pattern, text):
-                amenities.append(amenity_code)
-        
-        # Additional patterns for common variations
-        amenity_patterns = {
-            r'\bpool\b': "SWIMMING_POOL",
-            r'\bworkout\b': "FITNESS_CENTER",
-            r'\bexercise\b': "FITNESS_CENTER",
-            r'\bfree\s+wifi\b': "WIFI",
-            r'\binternet\b': "WIFI",
-            r'\bwireless\b': "WIFI",
-            r'\bpark\b': "PARKING",
-            r'\bvalet\b': "VALET_PARKING"
-        }
-        
-        for pattern, code in amenity_patterns.items():
-            if re.search(pattern, text):
-                amenities.append(code)
-        
-        return list(set(amenities))  # Remove duplicates
+        codes = _AMENITY_CODES
+        # One scan over the text; duplicates drop out, keeping first-mention order
+        return list(dict.fromkeys(codes[m.lastindex - 1] for m in _AMENITY_SCANNER.finditer(text)))
     
     def _extract_ratings(self, text: str) -> List[str]:
         """Extract star ratings from text"""
         ratings = []
         
-        for pattern, rating in RATING_PATTERNS.items():
-            if re.search(pattern, text):
+        for regex, rating in _RATING_REGEXES:
+            if regex.search(text):
                 ratings.append(rating)
         
-        return list(set(ratings))
+        return list(dict.fromkeys(ratings))
     
     def _extract_locations(self, text: str) -> List[str]:
         """Extract location entities using regex patterns"""
         locations = []
         
-        # Common city patterns
-        city_patterns = [
-            r'\bin\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)\b',  # "in Paris", "in New York"
-            r'\bnear\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)\b',  # "near London"
-            r'\b([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)\s+area\b',  # "Paris area"
-        ]
-        
-        for pattern in city_patterns:
-            matches = re.findall(pattern, text)
-            for match in matches:
+        for regex in _CITY_REGEXES:
+            for match in regex.findall(text):
                 if len(match.split()) <= 3:  # Limit to reasonable city names
                     locations.append(match.strip())
         
-        # Known major cities (case-insensitive matching)
-        major_cities = [
-            'paris', 'london', 'new york', 'tokyo', 'sydney', 'dubai', 'singapore',
-            'berlin', 'rome', 'madrid', 'barcelona', 'amsterdam', 'vienna', 'prague',
-            'budapest', 'warsaw', 'moscow', 'istanbul', 'cairo', 'cape town',
-            'rio de janeiro', 'buenos aires', 'mexico city', 'toronto', 'vancouver',
-            'san francisco', 'los angeles', 'chicago', 'miami', 'boston', 'seattle'
-        ]
+        locations.extend(city.title() for city in _MAJOR_CITIES_RE.findall(text))
         
-        for city in major_cities:
-            if re.search(r'\b' + re.escape(city) + r'\b', text):
-                locations.append(city.title())
-        
-        return list(set(locations))
+        return list(dict.fromkeys(locations))
     
     def _extract_chains(self, text: str) -> List[str]:
         """Extract hotel chain names"""
-        # Common hotel chain patterns
-        chain_patterns = [
-            r"\bmarriott\b", r"\bhyatt\b", r"\bhilton\b", r"\bihg\b",
-            r"\baccor\b", r"\bwyndham\b", r"\bchoice\b", r"\bradisson\b",
-            r"\bintercontinental\b", r"\bfour\s*seasons\b", r"\britz\b",
-            r"\bsheraton\b", r"\bwestin\b", r"\bnovotel\b", r"\bmercure\b"
-        ]
-        
         chains = []
         
-        for pattern in chain_patterns:
-            match = re.search(pattern, text)
+        for regex in _CHAIN_REGEXES:
+            match = regex.search(text)
             if match:
                 chains.append(match.group().strip())
         
@@ -187,8 +192,13 @@ def extract_hotel_preferences(text: str) -> Dict[str, List[str]]:
     Returns:
         Dictionary with extracted preferences
     """
-    extractor = HotelPreferenceExtractor()
-    return extractor.extract_preferences(text)
+    # Lists are rebuilt per call so callers can't mutate the cached entry
+    return {key: list(values) for key, values in _cached_preferences(text)}
+
+@lru_cache(maxsize=1024)
+def _cached_preferences(text: str):
+    # Extraction is pure, so repeated texts (retries, pagination) skip the regex work
+    return tuple((key, tuple(values)) for key, values in _extractor.extract_preferences(text).items())
 
 def sanitize_user_input(text: str) -> str:
     """
@@ -204,7 +214,7 @@ def sanitize_user_input(text: str) -> str:
         return ""
     
     # Remove potentially harmful characters
-    text = re.sub(r'[<>"\']', '', text)
+    text = text.translate(_STRIP_TABLE)
     
     # Limit length
     text = text[:500]
@@ -213,3 +223,5 @@ def sanitize_user_input(text: str) -> str:
     text = ' '.join(text.split())
     
     return text.strip()
+
+_extractor = HotelPreferenceExtractor()
@@ -1,19 +1,61 @@
 import os
 from typing import Dict, Any, List, Optional
+import orjson
 import requests
-from config import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from config import get_settings
+from utils.cache import SingleFlight, TTLCache
 
 
 SERPAPI_BASE = "https://serpapi.com/search.json"
 
+# Seconds a successful response is reused: autocomplete fires per keystroke,
+# hotel prices move slowly enough that a few minutes is safe
+AUTOCOMPLETE_CACHE_TTL = 30
+SEARCH_CACHE_TTL = 300
+
+# google_hotels filters passed through when the caller sets them
+HOTELS_SEARCH_OPTIONAL_KEYS = (
+    "adults", "children", "children_ages", "sort_by", "min_price", "max_price",
+    "property_types", "amenities", "rating", "brands", "hotel_class", "free_cancellation",
+    "special_offers", "eco_certified", "vacation_rentals", "next_page_token"
+)
+
 
 class SerpApiClient:
     def __init__(self, api_key: Optional[str] = None, default_gl: Optional[str] = None, default_hl: Optional[str] = None, default_currency: Optional[str] = None):
         # Prefer configured settings over raw env
+        settings = get_settings()
         self.api_key = api_key or settings.serpapi_api_key or os.getenv("SERPAPI_API_KEY", "")
         self.default_gl = default_gl or settings.serpapi_gl or "us"
         self.default_hl = default_hl or settings.serpapi_hl or "en"
         self.default_currency = default_currency or settings.serpapi_currency or "USD"
+        # Keep-alive pool so repeated calls skip the TCP + TLS handshake; gateway
+        # hiccups are retried, and the last response still reaches _get's error handling
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=50,
+            max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=(502, 503, 504), raise_on_status=False),
+        ))
+        # Hotel result pages are large JSON documents; always ask for them compressed
+        self.session.headers["Accept-Encoding"] = "gzip, deflate"
+        # google_hotels params every search/details call starts from
+        self._hotels_base = {
+            "engine": "google_hotels",
+            "gl": self.default_gl,
+            "hl": self.default_hl,
+            "currency": self.default_currency,
+        }
+        # Successful responses keyed by request params (api_key excluded), plus the
+        # requests currently on the wire so identical concurrent calls share one
+        self._cache = TTLCache(maxsize=1024, ttl=SEARCH_CACHE_TTL)
+        self._in_flight = SingleFlight()
+
+    def close(self) -> None:
+        """Release pooled connections (e.g. on app shutdown)"""
+        self.session.close()
 
     def _get(self, params: Dict[str, Any]) -> Dict[str, Any]:
         if not self.api_key:
@@ -23,63 +65,69 @@ class SerpApiClient:
             "api_key": self.api_key,
         }
         try:
-            resp = requests.get(SERPAPI_BASE, params=merged, timeout=20)
+            resp = self.session.get(SERPAPI_BASE, params=merged, timeout=20)
             if resp.status_code >= 400:
                 try:
-                    body = resp.json()
+                    body = orjson.loads(resp.content)
                 except Exception:
                     body = {"error": resp.text}
                 return {"error": body.get("error") or body, "status_code": resp.status_code}
-            return resp.json()
-        except requests.RequestException as e:
+            return orjson.loads(resp.content)
+        except (requests.RequestException, orjson.JSONDecodeError) as e:
             return {"error": f"SerpApi request failed: {e}", "status_code": 502}
 
+    def _cached_get(self, params: Dict[str, Any], ttl: float) -> Dict[str, Any]:
+        key = tuple(sorted(params.items()))
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+        return self._in_flight.do(key, self._fetch_and_cache, params, key, ttl)
+
+    def _fetch_and_cache(self, params: Dict[str, Any], key: tuple, ttl: float) -> Dict[str, Any]:
+        result = self._get(params)
+        if isinstance(result, dict) and not result.get("error"):
+            self._cache.set(key, result, ttl=ttl)
+        return result
+
+    def _hotels_base_params(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        # Copy the defaults template and patch only what the caller overrides
+        base_params = self._hotels_base.copy()
+        for key in ("gl", "hl", "currency"):
+            if value := params.get(key):
+                base_params[key] = value
+        return base_params
+
     def hotels_autocomplete(self, q: str, gl: Optional[str] = None, hl: Optional[str] = None, currency: Optional[str] = None) -> Dict[str, Any]:
-        result = self._get({
+        result = self._cached_get({
             "engine": "google_hotels_autocomplete",
             "q": q,
             "gl": gl or self.default_gl,
             "hl": hl or self.default_hl,
             "currency": currency or self.default_currency,
-        })
+        }, AUTOCOMPLETE_CACHE_TTL)
         if not isinstance(result, dict):
             return {"suggestions": []}
         return result
 
     def hotels_search(self, params: Dict[str, Any]) -> Dict[str, Any]:
-        base_params = {
-            "engine": "google_hotels",
-            "gl": params.get("gl") or self.default_gl,
-            "hl": params.get("hl") or self.default_hl,
-            "currency": params.get("currency") or self.default_currency,
-        }
+        base_params = self._hotels_base_params(params)
         base_params.update({
             "q": params["q"],
             "check_in_date": params["check_in_date"],
             "check_out_date": params["check_out_date"],
         })
 
-        optional_keys = [
-            "adults", "children", "children_ages", "sort_by", "min_price", "max_price",
-            "property_types", "amenities", "rating", "brands", "hotel_class", "free_cancellation",
-            "special_offers", "eco_certified", "vacation_rentals", "next_page_token"
-        ]
-        for k in optional_keys:
-            if params.get(k) not in (None, ""):
-                base_params[k] = params[k]
+        for k in HOTELS_SEARCH_OPTIONAL_KEYS:
+            if (value := params.get(k)) not in (None, ""):
+                base_params[k] = value
 
-        result = self._get(base_params)
+        result = self._cached_get(base_params, SEARCH_CACHE_TTL)
         if not isinstance(result, dict):
             return {"properties": []}
         return result
 
     def hotel_property_details(self, params: Dict[str, Any]) -> Dict[str, Any]:
-        base_params = {
-            "engine": "google_hotels",
-            "gl": params.get("gl") or self.default_gl,
-            "hl": params.get("hl") or self.default_hl,
-            "currency": params.get("currency") or self.default_currency,
-        }
+        base_params = self._hotels_base_params(params)
         # required context
         base_params.update({
             "q": params["q"],
@@ -94,54 +142,58 @@ class SerpApiClient:
         return result
 
 
-def map_serp_properties_to_hotel_offers(properties: List[Dict[str, Any]], check_in: str, check_out: str, currency: str, guests: Optional[int] = None, rooms: Optional[int] = None) -> List[Dict[str, Any]]:
-    mapped: List[Dict[str, Any]] = []
-    for p in properties or []:
-        hotel_id = p.get("property_token") or p.get("link") or p.get("name")
-        rate = (p.get("total_rate") or {}).get("extracted_lowest")
-        if rate is None:
-            rate = (p.get("rate_per_night") or {}).get("extracted_lowest")
-
-        # Images & amenities
-        thumb = None
-        full = None
-        imgs = p.get("images") or []
-        if imgs:
-            thumb = imgs[0].get("thumbnail")
-            full = imgs[0].get("original_image")
-        amenities = p.get("amenities") or []
-
-        offers = []
-        if rate is not None:
-            offers.append({
-                "price": {
-                    "total": rate,
-                    "currency": currency,
-                },
-                "checkInDate": check_in,
-                "checkOutDate": check_out,
-                "guests": guests,
-                "rooms": rooms,
-            })
-
-        mapped.append({
-            "hotel": {
-                "hotelId": str(hotel_id),
-                "name": p.get("name"),
-                "chainCode": (p.get("prices") or [{}])[0].get("source", ""),
-                "cityCode": "",
-                "distance": {},
-                "thumbnail": thumb,
-                "image": full,
-                "amenities": amenities,
+def _lowest_rate(p: Dict[str, Any]):
+    # Conditional lookups instead of `(p.get(x) or {}).get(y)`: no throwaway dicts
+    total_rate = p.get("total_rate")
+    rate = total_rate.get("extracted_lowest") if total_rate else None
+    if rate is None:
+        per_night = p.get("rate_per_night")
+        rate = per_night.get("extracted_lowest") if per_night else None
+    return rate
+
+
+def _map_property(p: Dict[str, Any], check_in: str, check_out: str, currency: str, guests: Optional[int], rooms: Optional[int]) -> Dict[str, Any]:
+    hotel_id = p.get("property_token") or p.get("link") or p.get("name")
+    rate = _lowest_rate(p)
+
+    # Images & amenities
+    thumb = None
+    full = None
+    imgs = p.get("images")
+    if imgs:
+        first = imgs[0]
+        thumb = first.get("thumbnail")
+        full = first.get("original_image")
+
+    prices = p.get("prices")
+    return {
+        "hotel": {
+            "hotelId": str(hotel_id),
+            "name": p.get("name"),
+            "chainCode": prices[0].get("source", "") if prices else "",
+            "cityCode": "",
+            "distance": {},
+            "thumbnail": thumb,
+            "image": full,
+            "amenities": p.get("amenities") or [],
+        },
+        "offers": [] if rate is None else [{
+            "price": {
+                "total": rate,
+                "currency": currency,
             },
-            "offers": offers,
-            "serpapi": {
-                "overall_rating": p.get("overall_rating"),
-                "reviews": p.get("reviews"),
-                "hotel_class": p.get("extracted_hotel_class") or p.get("hotel_class"),
-            }
-        })
-    return mapped
+            "checkInDate": check_in,
+            "checkOutDate": check_out,
+            "guests": guests,
+            "rooms": rooms,
+        }],
+        "serpapi": {
+            "overall_rating": p.get("overall_rating"),
+            "reviews": p.get("reviews"),
+            "hotel_class": p.get("extracted_hotel_class") or p.get("hotel_class"),
+        }
+    }
 
 
+def map_serp_properties_to_hotel_offers(properties: List[Dict[str, Any]], check_in: str, check_out: str, currency: str, guests: Optional[int] = None, rooms: Optional[int] = None) -> List[Dict[str, Any]]:
+    return [_map_property(p, check_in, check_out, currency, guests, rooms) for p in properties or []]
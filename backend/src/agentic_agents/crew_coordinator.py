@@ -1,8 +1,14 @@
 from typing import Any, Dict, List
-import statistics
-from services.amadeus_service import search_flights
+from dataclasses import dataclass
+import asyncio
+import heapq
+import os
 from functools import lru_cache
+import requests
+from services.amadeus_service import search_flights_async
 from database import db_manager
+from fastapi import BackgroundTasks
+from utils.cache import TTLCache
 import datetime
 
 try:
@@ -10,6 +16,37 @@ try:
 except Exception:
     GroqLLMManager = None  # type: ignore
 
+# ciso8601 is a C ISO-8601 parser that takes the trailing "Z" as-is; optional
+try:
+    from ciso8601 import parse_datetime as _parse_dt
+except ImportError:
+    def _parse_dt(value: str) -> datetime.datetime:
+        return datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+# Seconds to wait on the LLM explanation before using basic_explanation instead
+EXPLANATION_TIMEOUT = 5.0
+
+
+@dataclass(slots=True)
+class OfferView:
+    """An offer that passed the filters, priced in the target currency"""
+    id: str | None
+    price: float
+    currency: str
+    itineraries: List[Dict[str, Any]]
+    highlights: Dict[str, Any]
+
+    def as_dict(self) -> Dict[str, Any]:
+        # Shallow on purpose; dataclasses.asdict would deep-copy the itineraries
+        return {
+            "id": self.id,
+            "price": self.price,
+            "currency": self.currency,
+            "itineraries": self.itineraries,
+            "highlights": self.highlights,
+        }
+
 
 class TravelCrewCoordinator:
     """Coordinator skeleton. Wire CrewAI agents later."""
@@ -18,20 +55,28 @@ class TravelCrewCoordinator:
         # Defer heavy imports until implementation step
         self.version = "0.1.0"
 
-    async def execute_travel_analysis(self, request: Dict[str, Any], user: Dict[str, Any] | None = None) -> Dict[str, Any]:
+    async def execute_travel_analysis(
+        self,
+        request: Dict[str, Any],
+        user: Dict[str, Any] | None = None,
+        background_tasks: BackgroundTasks | None = None,
+    ) -> Dict[str, Any]:
         origin = request.get("origin")
         destination = request.get("destination")
         departure_date = request.get("departure_date")
         return_date = request.get("return_date")
         travelers = int(request.get("travelers", 1))
         target_currency = (request.get("currency") or "USD").upper()
-        preferences = request.get("preferences") or {}
-        max_stops = int(preferences.get("max_stops", 1)) if isinstance(preferences, dict) else 1
-        preferred_carriers = set(map(str.upper, preferences.get("preferred_carriers", []))) if isinstance(preferences, dict) else set()
-        exclude_redeye = bool(preferences.get("exclude_redeye", False)) if isinstance(preferences, dict) else False
-        min_layover_minutes = int(preferences.get("min_layover_minutes", 0)) if isinstance(preferences, dict) else 0
-        max_total_travel_minutes = int(preferences.get("max_total_travel_minutes", 0)) if isinstance(preferences, dict) else 0
-        cabin_class = (preferences.get("cabin_class") or "ANY").upper() if isinstance(preferences, dict) else "ANY"
+        preferences = request.get("preferences")
+        # Non-dict preferences fall back to every default
+        if not isinstance(preferences, dict):
+            preferences = {}
+        max_stops = int(preferences.get("max_stops", 1))
+        preferred_carriers = frozenset(map(str.upper, preferences.get("preferred_carriers", [])))
+        exclude_redeye = bool(preferences.get("exclude_redeye", False))
+        min_layover_minutes = int(preferences.get("min_layover_minutes", 0))
+        max_total_travel_minutes = int(preferences.get("max_total_travel_minutes", 0))
+        cabin_class = (preferences.get("cabin_class") or "ANY").upper()
 
         # Simple in-memory cache key
         cache_key = (
@@ -41,10 +86,13 @@ class TravelCrewCoordinator:
             return_date or "",
             travelers,
         )
-        results = cached_search_sweep(*cache_key)
+        results = await cached_search_sweep(*cache_key)
 
         prices: List[float] = []
-        offers: List[Dict[str, Any]] = []
+        offers: List[OfferView] = []
+        # Rate per source currency, resolved once per request rather than per offer
+        # (live rates for pairs outside _FX are also cached across requests)
+        fx_rates: Dict[str, float | None] = {}
         if isinstance(results, list):
             for offer in results:
                 try:
@@ -73,44 +121,51 @@ class TravelCrewCoordinator:
                         continue
 
                     # Normalize currency
-                    normalized_price = convert_currency(total, from_currency=currency, to_currency=target_currency)
+                    if currency in fx_rates:
+                        rate = fx_rates[currency]
+                    else:
+                        rate = fx_rates[currency] = conversion_rate(currency, target_currency)
+                    normalized_price = total if rate is None else round(total * rate, 2)
 
                     if normalized_price > 0:
                         prices.append(normalized_price)
-                        offers.append({
-                            "id": offer.get("id"),
-                            "price": normalized_price,
-                            "currency": target_currency,
-                            "itineraries": itineraries,
-                            "highlights": build_highlights(itineraries),
-                        })
+                        offers.append(OfferView(
+                            id=offer.get("id"),
+                            price=normalized_price,
+                            currency=target_currency,
+                            itineraries=itineraries,
+                            highlights=build_highlights(itineraries),
+                        ))
                 except Exception:
                     continue
 
         summary: Dict[str, Any] = {}
         if prices:
+            # One sort serves every statistic; min/max are its ends, the median its middle
             prices_sorted = sorted(prices)
+            n = len(prices_sorted)
+            mid = n // 2
+            median = prices_sorted[mid] if n % 2 else (prices_sorted[mid - 1] + prices_sorted[mid]) / 2
             summary = {
-                "count": len(prices),
-                "min": min(prices),
+                "count": n,
+                "min": prices_sorted[0],
                 "p25": percentile(prices_sorted, 25),
-                "median": statistics.median(prices),
+                "median": median,
                 "p75": percentile(prices_sorted, 75),
-                "max": max(prices),
+                "max": prices_sorted[-1],
             }
 
         recommendations: List[Dict[str, Any]] = []
         recommendation = None
         if offers:
             target = summary.get("median") if summary else None
-            ranked = []
-            for o in offers:
-                score = o["price"]
-                if target is not None:
-                    score = abs(o["price"] - target) + 0.01 * o["price"]
-                ranked.append((score, o))
-            ranked.sort(key=lambda x: x[0])
-            top = [o for _, o in ranked[:3]]
+            if target is not None:
+                score = lambda o: abs(o.price - target) + 0.01 * o.price
+            else:
+                score = lambda o: o.price
+            # Only the best three are needed; nsmallest keeps sort order (ties included).
+            # Just these are turned into response dicts
+            top = [o.as_dict() for o in heapq.nsmallest(3, offers, key=score)]
             recommendation = top[0] if top else None
             recommendations = [annotate_pros_cons(x, target) for x in top]
 
@@ -118,7 +173,10 @@ class TravelCrewCoordinator:
         if GroqLLMManager and recommendation:
             try:
                 llm = GroqLLMManager()
-                explanation = llm.generate_explanation(
+                # The Groq client is blocking; run it off the event loop and fall back to
+                # the heuristic explanation if it is slow
+                explanation = await asyncio.wait_for(asyncio.to_thread(
+                    llm.generate_explanation,
                     agent_name="Heuristic Travel Coordinator",
                     decision_data={
                         "summary": summary,
@@ -131,7 +189,7 @@ class TravelCrewCoordinator:
                         "date_window": "+/- 3 days",
                         "target_currency": target_currency,
                     },
-                )
+                ), timeout=EXPLANATION_TIMEOUT)
             except Exception:
                 explanation = None
 
@@ -159,32 +217,69 @@ class TravelCrewCoordinator:
             "explanation": explanation,
         }
 
-        # Persist simple history document (best-effort)
-        try:
-            if db_manager and db_manager.database:
-                coll = db_manager.get_collection("agentic_search_history")
-                doc = {
-                    "ts": datetime.datetime.utcnow().isoformat() + "Z",
-                    "route": {"origin": origin, "destination": destination},
-                    "dates": {"departure": departure_date, "return": return_date},
-                    "prefs": {
-                        "max_stops": max_stops,
-                        "exclude_redeye": exclude_redeye,
-                        "preferred_carriers": list(preferred_carriers),
-                        "min_layover_minutes": min_layover_minutes,
-                        "max_total_travel_minutes": max_total_travel_minutes,
-                        "cabin_class": cabin_class,
-                    },
-                    "summary": summary,
-                    "recommendation_price": recommendation.get("price") if recommendation else None,
-                }
-                coll.insert_one(doc)
-        except Exception:
-            pass
+        # Persist simple history document (best-effort). The caller gets its answer
+        # without waiting on the write when it hands us a BackgroundTasks.
+        if db_manager and db_manager.database is not None:
+            doc = {
+                "ts": datetime.datetime.utcnow().isoformat() + "Z",
+                "route": {"origin": origin, "destination": destination},
+                "dates": {"departure": departure_date, "return": return_date},
+                "prefs": {
+                    "max_stops": max_stops,
+                    "exclude_redeye": exclude_redeye,
+                    "preferred_carriers": list(preferred_carriers),
+                    "min_layover_minutes": min_layover_minutes,
+                    "max_total_travel_minutes": max_total_travel_minutes,
+                    "cabin_class": cabin_class,
+                },
+                "summary": summary,
+                "recommendation_price": recommendation.get("price") if recommendation else None,
+            }
+            if background_tasks is not None:
+                background_tasks.add_task(persist_search_history, doc)
+            else:
+                await persist_search_history(doc)
 
         return result_obj
 
 
+# History documents are written in batches: a flush runs once HISTORY_BATCH_SIZE docs
+# are queued, or HISTORY_FLUSH_INTERVAL seconds after the first queued doc
+HISTORY_BATCH_SIZE = 100
+HISTORY_FLUSH_INTERVAL = 5.0
+_history_buffer: List[Dict[str, Any]] = []
+_history_flush_task: "asyncio.Task[None] | None" = None
+
+
+async def persist_search_history(doc: Dict[str, Any]) -> None:
+    global _history_flush_task
+    _history_buffer.append(doc)
+    if len(_history_buffer) >= HISTORY_BATCH_SIZE:
+        await flush_search_history()
+    elif _history_flush_task is None:
+        _history_flush_task = asyncio.create_task(_flush_search_history_later())
+
+
+async def _flush_search_history_later() -> None:
+    global _history_flush_task
+    await asyncio.sleep(HISTORY_FLUSH_INTERVAL)
+    _history_flush_task = None
+    await flush_search_history()
+
+
+async def flush_search_history() -> None:
+    """Write every queued history document (best-effort)."""
+    if not _history_buffer:
+        return
+    docs = _history_buffer[:]
+    _history_buffer.clear()
+    try:
+        coll = db_manager.get_collection("agentic_search_history")
+        await coll.insert_many(docs, ordered=False)
+    except Exception:
+        pass
+
+
 def percentile(sorted_values: List[float], pct: float) -> float:
     if not sorted_values:
         return 0.0
@@ -202,121 +297,146 @@ def passes_filters(
     itineraries: List[Dict[str, Any]],
     max_stops: int,
     exclude_redeye: bool,
-    preferred_carriers: set[str],
+    preferred_carriers: frozenset[str],
     min_layover_minutes: int,
     max_total_travel_minutes: int,
 ) -> bool:
-    # Stop count filter
+    # One pass over the segments applies every filter, stopping at the first violation.
+    # Timestamps are parsed through a memoized helper, so a segment's departure/arrival
+    # is parsed once however many filters read it.
+    check_layover = min_layover_minutes > 0
+    check_travel = max_total_travel_minutes > 0
+    total_minutes = 0
     for itin in itineraries:
         segments = itin.get("segments", []) or []
         total_stops = 0
+        prev_seg = None
         for seg in segments:
+            # Stop count filter
             total_stops += int(seg.get("numberOfStops", 0))
-        if total_stops > max_stops:
-            return False
 
-    # Red-eye filter (departure between 00:00–05:00 local time)
-    if exclude_redeye:
-        for itin in itineraries:
-            for seg in (itin.get("segments", []) or []):
+            # Preferred carriers (if provided, every segment should match one)
+            if preferred_carriers:
+                carrier = seg.get("operating", {}).get("carrierCode") or seg.get("carrierCode")
+                if carrier:
+                    # IATA codes normally arrive uppercase already
+                    if not carrier.isupper():
+                        carrier = carrier.upper()
+                    if carrier not in preferred_carriers:
+                        return False
+
+            # Red-eye filter (departure between 00:00–05:00 local time)
+            if exclude_redeye:
                 dep_time = seg.get("departure", {}).get("at")
                 if dep_time:
-                    try:
-                        # naive parse; timestamps are ISO8601, ignore tz for heuristic
-                        t = datetime.datetime.fromisoformat(dep_time.replace("Z", "+00:00"))
-                        if 0 <= t.hour < 5:
+                    t = _parse_iso_datetime(dep_time)
+                    if t is not None and 0 <= t.hour < 5:
+                        return False
+
+            # Layover rule (min layover minutes)
+            if check_layover and prev_seg is not None:
+                prev_arr = prev_seg.get("arrival", {}).get("at")
+                dep_next = seg.get("departure", {}).get("at")
+                if prev_arr and dep_next:
+                    a = _parse_iso_datetime(prev_arr)
+                    d = _parse_iso_datetime(dep_next)
+                    if a is not None and d is not None:
+                        try:
+                            layover = (d - a).total_seconds() / 60.0
+                        except TypeError:
+                            layover = None
+                        if layover is not None and layover < min_layover_minutes:
                             return False
-                    except Exception:
-                        pass
-
-    # Preferred carriers (if provided, every segment should match one)
-    if preferred_carriers:
-        for itin in itineraries:
-            for seg in (itin.get("segments", []) or []):
-                carrier = (seg.get("operating", {}).get("carrierCode") or seg.get("carrierCode") or "").upper()
-                if carrier and carrier not in preferred_carriers:
-                    return False
-
-    # Layover rule (min layover minutes)
-    if min_layover_minutes > 0:
-        for itin in itineraries:
-            segments = itin.get("segments", []) or []
-            for i in range(1, len(segments)):
-                prev_arr = segments[i - 1].get("arrival", {}).get("at")
-                dep_next = segments[i].get("departure", {}).get("at")
-                try:
-                    if prev_arr and dep_next:
-                        a = datetime.datetime.fromisoformat(prev_arr.replace("Z", "+00:00"))
-                        d = datetime.datetime.fromisoformat(dep_next.replace("Z", "+00:00"))
-                        layover = (d - a).total_seconds() / 60.0
-                        if layover < min_layover_minutes:
-                            return False
-                except Exception:
-                    continue
 
-    # Max total travel time
-    if max_total_travel_minutes > 0:
-        total_minutes = 0
-        for itin in itineraries:
-            for seg in (itin.get("segments", []) or []):
-                # prefer using ISO duration if available, else compute
+            # Max total travel time: prefer using ISO duration if available, else compute
+            if check_travel:
                 dur = seg.get("duration")
                 if dur and dur.startswith("PT"):
-                    minutes = parse_iso_duration_minutes(dur)
-                    total_minutes += minutes
+                    total_minutes += parse_iso_duration_minutes(dur)
                 else:
                     dep = seg.get("departure", {}).get("at")
                     arr = seg.get("arrival", {}).get("at")
-                    try:
-                        if dep and arr:
-                            d = datetime.datetime.fromisoformat(dep.replace("Z", "+00:00"))
-                            a = datetime.datetime.fromisoformat(arr.replace("Z", "+00:00"))
-                            total_minutes += (a - d).total_seconds() / 60.0
-                    except Exception:
-                        continue
-        if total_minutes > max_total_travel_minutes:
+                    if dep and arr:
+                        d = _parse_iso_datetime(dep)
+                        a = _parse_iso_datetime(arr)
+                        if d is not None and a is not None:
+                            try:
+                                total_minutes += (a - d).total_seconds() / 60.0
+                            except TypeError:
+                                pass
+
+            prev_seg = seg
+        if total_stops > max_stops:
             return False
 
+    if check_travel and total_minutes > max_total_travel_minutes:
+        return False
+
     return True
 
 
-_FX = {
-    ("EUR", "USD"): 1.08,
-    ("USD", "EUR"): 0.93,
+def _parse_iso_datetime(value: Any) -> datetime.datetime | None:
+    # naive parse; timestamps are ISO8601, ignore tz for heuristic
+    if not isinstance(value, str):
+        return None
+    return _parse_iso_datetime_str(value)
+
+
+@lru_cache(maxsize=4096)
+def _parse_iso_datetime_str(value: str) -> datetime.datetime | None:
+    try:
+        return _parse_dt(value)
+    except ValueError:
+        return None
+
+
+# Static rates, keyed from -> to
+_FX: Dict[str, Dict[str, float]] = {
+    "EUR": {"USD": 1.08},
+    "USD": {"EUR": 0.93},
 }
+_NO_RATES: Dict[str, float] = {}
 
+# Live rates per (from, to). Lookups that found no rate are remembered for less time
+# so a flaky FX endpoint is retried soon without being called on every request
+FX_CACHE_TTL = 600
+FX_MISS_CACHE_TTL = 60
+_live_fx_cache = TTLCache(maxsize=256, ttl=FX_CACHE_TTL)
+_FX_NOT_CACHED = object()
 
-def convert_currency(amount: float, from_currency: str, to_currency: str) -> float:
+
+def conversion_rate(from_currency: str, to_currency: str) -> float | None:
+    """Multiplier from -> to, or None when amounts should pass through unchanged"""
     if from_currency == to_currency:
-        return amount
-    rate = _FX.get((from_currency, to_currency))
+        return None
+    rate = _FX.get(from_currency, _NO_RATES).get(to_currency)
     if rate is None:
         # Try live FX if available, else 1:1
-        try:
-            live_rate = fetch_live_fx(from_currency, to_currency)
-            if live_rate:
-                return round(amount * live_rate, 2)
-        except Exception:
-            pass
-        return amount
-    return round(amount * rate, 2)
+        key = (from_currency, to_currency)
+        rate = _live_fx_cache.get(key, _FX_NOT_CACHED)
+        if rate is _FX_NOT_CACHED:
+            try:
+                rate = fetch_live_fx(from_currency, to_currency) or None
+            except Exception:
+                rate = None
+            _live_fx_cache.set(key, rate, ttl=None if rate else FX_MISS_CACHE_TTL)
+    return rate
+
+
+def convert_currency(amount: float, from_currency: str, to_currency: str) -> float:
+    rate = conversion_rate(from_currency, to_currency)
+    return amount if rate is None else round(amount * rate, 2)
 
 
 def expand_dates(departure_date: str, return_date: str | None, window_days: int = 3) -> List[tuple[str, str | None]]:
-    def parse(d: str) -> datetime.date:
-        return datetime.date.fromisoformat(d)
-
-    dd = parse(departure_date)
-    rd = parse(return_date) if return_date else None
-    out: List[tuple[str, str | None]] = []
-    for offset in range(-window_days, window_days + 1):
-        d = dd + datetime.timedelta(days=offset)
-        if rd:
-            r = rd + datetime.timedelta(days=offset)
-            out.append((d.isoformat(), r.isoformat()))
-        else:
-            out.append((d.isoformat(), None))
-    return out
+    # Shift proleptic day ordinals instead of building a timedelta per offset
+    from_ordinal = datetime.date.fromordinal
+    dd = datetime.date.fromisoformat(departure_date).toordinal()
+    rd = datetime.date.fromisoformat(return_date).toordinal() if return_date else None
+    offsets = range(-window_days, window_days + 1)
+    if rd is None:
+        return [(from_ordinal(dd + o).isoformat(), None) for o in offsets]
+    return [(from_ordinal(dd + o).isoformat(), from_ordinal(rd + o).isoformat()) for o in offsets]
 
 
 def basic_explanation(
@@ -353,8 +473,10 @@ def basic_explanation(
     return stats + filt + rec
 
 
+@lru_cache(maxsize=1024)
 def parse_iso_duration_minutes(iso: str) -> int:
-    # very small parser for like PT5H35M
+    # very small parser for like PT5H35M. Memoized: a sweep repeats the same
+    # flights (and so the same few durations) across thousands of offers
     hours = 0
     minutes = 0
     try:
@@ -379,13 +501,9 @@ def annotate_pros_cons(offer: Dict[str, Any], median_price: float | None) -> Dic
             pros.append("priced at or below median")
         else:
             cons.append("priced above median")
-    # Non-stop detection
-    nonstop = True
-    for itin in (offer.get("itineraries", []) or []):
-        for seg in (itin.get("segments", []) or []):
-            if int(seg.get("numberOfStops", 0)) > 0:
-                nonstop = False
-    if nonstop:
+    # Non-stop detection, reusing the stop count build_highlights already summed
+    highlights = offer.get("highlights") or build_highlights(offer.get("itineraries", []) or [])
+    if highlights["stops"] == 0:
         pros.append("non-stop segments")
     else:
         cons.append("one or more stops")
@@ -400,13 +518,16 @@ def build_highlights(itineraries: List[Dict[str, Any]]) -> Dict[str, Any]:
     # Extract quick highlights for UI
     total_stops = 0
     carriers: List[str] = []
+    seen_carriers: set[str] = set()
     first_dep = None
     last_arr = None
     for itin in itineraries:
         for seg in (itin.get("segments", []) or []):
             total_stops += int(seg.get("numberOfStops", 0))
             carrier = seg.get("operating", {}).get("carrierCode") or seg.get("carrierCode")
-            if carrier and carrier not in carriers:
+            # Set for the membership test, list for first-seen display order
+            if carrier and carrier not in seen_carriers:
+                seen_carriers.add(carrier)
                 carriers.append(carrier)
             dep = seg.get("departure", {}).get("at")
             arr = seg.get("arrival", {}).get("at")
@@ -423,8 +544,6 @@ def build_highlights(itineraries: List[Dict[str, Any]]) -> Dict[str, Any]:
 
 
 def fetch_live_fx(from_currency: str, to_currency: str) -> float | None:
-    import os
-    import requests
     # Try a free-ish endpoint if configured, else None
     fx_url = os.getenv("FX_API_URL")  # e.g., https://api.exchangerate.host/convert
     if not fx_url:
@@ -443,14 +562,39 @@ def fetch_live_fx(from_currency: str, to_currency: str) -> float | None:
     return None
 
 
-@lru_cache(maxsize=64)
-def cached_search_sweep(origin: str, destination: str, departure_date: str, return_date: str, travelers: int) -> List[Dict[str, Any]]:
+# Sweep results per (origin, destination, dates, travelers); fares go stale, so expire them.
+# SWEEP_CACHE_TTL (seconds) trades fare freshness against Amadeus calls
+SWEEP_CACHE_TTL = float(os.getenv("SWEEP_CACHE_TTL", "900"))
+_sweep_cache = TTLCache(maxsize=64, ttl=SWEEP_CACHE_TTL)
+# Sweeps currently running, so identical concurrent requests share one set of Amadeus calls
+_sweeps_in_flight: Dict[tuple, "asyncio.Task[List[Dict[str, Any]]]"] = {}
+
+
+async def cached_search_sweep(origin: str, destination: str, departure_date: str, return_date: str, travelers: int) -> List[Dict[str, Any]]:
+    key = (origin, destination, departure_date, return_date, travelers)
+    cached = _sweep_cache.get(key)
+    if cached is not None:
+        return cached
+    task = _sweeps_in_flight.get(key)
+    if task is None:
+        task = asyncio.create_task(_run_search_sweep(*key))
+        _sweeps_in_flight[key] = task
+        task.add_done_callback(lambda _t: _sweeps_in_flight.pop(key, None))
+    # shield: one caller disconnecting must not cancel the sweep for the others
+    return await asyncio.shield(task)
+
+
+async def _run_search_sweep(origin: str, destination: str, departure_date: str, return_date: str, travelers: int) -> List[Dict[str, Any]]:
     dates = expand_dates(departure_date, return_date if return_date else None, window_days=3)
+    # The date searches are independent; run them side by side instead of one after another
+    results = await asyncio.gather(*(
+        search_flights_async(origin, destination, dd, rd, travelers)
+        for dd, rd in dates
+    ))
     aggregated: List[Dict[str, Any]] = []
-    for dd, rd in dates:
-        res = search_flights(origin, destination, dd, rd, travelers)
+    for res in results:
         if isinstance(res, list):
             aggregated.extend(res)
+    if aggregated:
+        _sweep_cache.set((origin, destination, departure_date, return_date, travelers), aggregated)
     return aggregated
-
-
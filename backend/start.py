@@ -4,9 +4,10 @@ Startup script for TripCraft Backend
 """
 
 import uvicorn
-from config import settings
+from config import get_settings
 
 if __name__ == "__main__":
+    settings = get_settings()
     print("🚀 Starting TripCraft Backend...")
     print(f"📍 Server will run on http://{settings.host}:{settings.port}")
     print(f"📚 API Documentation: http://{settings.host}:{settings.port}/docs")
@@ -10,11 +10,14 @@ import json
 BASE_URL = "http://localhost:8005"
 API_BASE = f"{BASE_URL}/api/v1"
 
+# One keep-alive connection for the whole run instead of a new one per request
+session = requests.Session()
+
 def test_health_check():
     """Test health check endpoint"""
     print("🔍 Testing health check...")
     try:
-        response = requests.get(f"{BASE_URL}/health")
+        response = session.get(f"{BASE_URL}/health")
         if response.status_code == 200:
             print("✅ Health check passed")
             return True
@@ -29,7 +32,7 @@ def test_root_endpoint():
     """Test root endpoint"""
     print("🏠 Testing root endpoint...")
     try:
-        response = requests.get(BASE_URL)
+        response = session.get(BASE_URL)
         if response.status_code == 200:
             data = response.json()
             print(f"✅ Root endpoint working: {data.get('message', 'No message')}")
@@ -53,7 +56,7 @@ def test_user_registration():
     }
     
     try:
-        response = requests.post(
+        response = session.post(
             f"{API_BASE}/auth/register",
             json=test_user,
             headers={"Content-Type": "application/json"}
@@ -81,7 +84,7 @@ def test_user_login():
     }
     
     try:
-        response = requests.post(
+        response = session.post(
             f"{API_BASE}/auth/login",
             json=login_data,
             headers={"Content-Type": "application/json"}
@@ -113,7 +116,7 @@ def test_protected_endpoint(token):
             "Content-Type": "application/json"
         }
         
-        response = requests.get(
+        response = session.get(
             f"{API_BASE}/auth/me",
             headers=headers
         )
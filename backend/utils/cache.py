@@ -0,0 +1,176 @@
+"""
+Small in-process caches shared by the services and routers
+"""
+
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import orjson
+
+# Table names are interpolated into SQL, so only plain identifiers are accepted
+_TABLE_NAME_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+
+class TTLCache:
+    """Thread-safe bounded LRU mapping whose entries expire after ``ttl`` seconds"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for ``key`` or ``default`` if missing/expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Store ``value``; ``ttl`` overrides the cache default for this entry"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+_MISSING = object()
+
+
+class PersistentTTLCache(TTLCache):
+    """
+    TTLCache backed by a SQLite file so entries survive restarts.
+    Keys must be strings and values JSON-serializable. The disk layer is
+    best-effort: any SQLite error degrades to the in-memory cache.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, path: str, table: str):
+        if not _TABLE_NAME_RE.fullmatch(table):
+            raise ValueError(f"Invalid cache table name: {table!r}")
+        super().__init__(maxsize, ttl)
+        self._table = table
+        self._db_lock = threading.Lock()
+        try:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute(f"DELETE FROM {table} WHERE expires_at <= ?", (time.time(),))
+            self._db.commit()
+        except sqlite3.Error:
+            self._db = None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = super().get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if self._db is None:
+            return default
+        try:
+            with self._db_lock:
+                row = self._db.execute(
+                    f"SELECT value, expires_at FROM {self._table} WHERE key = ?", (key,)
+                ).fetchone()
+        except sqlite3.Error:
+            return default
+        if row is None:
+            return default
+        remaining = row[1] - time.time()
+        if remaining <= 0:
+            return default
+        value = orjson.loads(row[0])
+        # Warm the memory layer for the rest of the entry's lifetime
+        super().set(key, value, ttl=remaining)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        super().set(key, value, ttl)
+        if self._db is None:
+            return
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        try:
+            payload = orjson.dumps(value)
+            with self._db_lock:
+                self._db.execute(
+                    f"INSERT OR REPLACE INTO {self._table} (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, payload, expires_at),
+                )
+                self._db.commit()
+        except (sqlite3.Error, orjson.JSONEncodeError):
+            pass
+
+    def pop(self, key: str, default: Any = None) -> Any:
+        value = super().pop(key, default)
+        if self._db is not None:
+            try:
+                with self._db_lock:
+                    self._db.execute(f"DELETE FROM {self._table} WHERE key = ?", (key,))
+                    self._db.commit()
+            except sqlite3.Error:
+                pass
+        return value
+
+    def clear(self) -> None:
+        super().clear()
+        if self._db is not None:
+            try:
+                with self._db_lock:
+                    self._db.execute(f"DELETE FROM {self._table}")
+                    self._db.commit()
+            except sqlite3.Error:
+                pass
+
+
+class SingleFlight:
+    """Coalesces concurrent identical calls: while one call for a key runs, other
+    threads asking for the same key wait for its result instead of repeating it"""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Return ``fn(*args, **kwargs)``, shared with concurrent callers of ``key``"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result()
+        try:
+            result = fn(*args, **kwargs)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
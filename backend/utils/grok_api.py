@@ -1,7 +1,13 @@
+import hashlib
 import os
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 import logging
+from typing import Iterator, Optional
+
+from utils.cache import SingleFlight, TTLCache
 
 # Load environment variables
 load_dotenv()
@@ -13,36 +19,40 @@ GROK_API_KEY = os.getenv("GROK_API_KEY")
 GROK_API_URL = os.getenv("GROK_API_URL")
 GROQ_MODEL = os.getenv("GROQ_MODEL", "llama3-70b-8192")
 
-print(f"GROK_API_KEY: {GROK_API_KEY is not None}")
-print(f"GROK_API_URL: {GROK_API_URL}")
+logger.debug("GROK_API_KEY set: %s", GROK_API_KEY is not None)
+logger.debug("GROK_API_URL: %s", GROK_API_URL)
 
-def ask_grok(query: str, system_role: str = "You are a helpful travel assistant.") -> str:
-    """
-    Send a query to the Grok API and return the response
-    
-    Args:
-        query (str): The user query to send to the API
-        system_role (str): The system role/prompt for the AI
-        
-    Returns:
-        str: The AI response or error message
-    """
-    if not GROK_API_KEY or not GROK_API_URL:
-        error_msg = "GROK_API_KEY and GROK_API_URL must be set in environment variables"
-        logger.error(error_msg)
-        raise ValueError(error_msg)
-    
-    headers = {
-        "Authorization": f"Bearer {GROK_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    
+# Checked once here; calls made without the configuration raise this as a ValueError
+_CONFIG_ERROR = None
+if not GROK_API_KEY or not GROK_API_URL:
+    _CONFIG_ERROR = "GROK_API_KEY and GROK_API_URL must be set in environment variables"
+    logger.error(_CONFIG_ERROR)
+
+# Keep-alive connections to the LLM endpoint, so only the first call pays the TLS handshake
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=20))
+_session.headers.update({
+    "Authorization": f"Bearer {GROK_API_KEY}",
+    "Content-Type": "application/json"
+})
+
+# Successful completions keyed by a hash of (model, system role, query); opt-in per call
+_response_cache = TTLCache(maxsize=1024, ttl=86400)
+
+# Concurrent identical cacheable prompts share one completion
+_in_flight = SingleFlight()
+
+def _cache_key(query: str, system_role: str) -> str:
+    canonical = orjson.dumps({"model": GROQ_MODEL, "role": system_role, "q": query}, option=orjson.OPT_SORT_KEYS)
+    return hashlib.blake2b(canonical, digest_size=16).hexdigest()
+
+def _build_payload(query: str, system_role: str, stream: bool) -> dict:
     # Use model from environment with safe default. Examples:
     # - "llama3-70b-8192"
     # - "llama3-8b-8192"
     # - "mixtral-8x7b-32768"
     # - "llama-3.1-8b-instant" (if available to your account)
-    payload = {
+    return {
         "model": GROQ_MODEL,
         "messages": [
             {"role": "system", "content": system_role},
@@ -50,29 +60,60 @@ def ask_grok(query: str, system_role: str = "You are a helpful travel assistant.
         ],
         "temperature": 0.7,
         "max_tokens": 2000,  # Add max tokens to ensure complete responses
-        "stream": False
+        "stream": stream
     }
+
+def ask_grok(query: str, system_role: str = "You are a helpful travel assistant.", cache_ttl: Optional[float] = None) -> str:
+    """
+    Send a query to the Grok API and return the response
+    
+    Args:
+        query (str): The user query to send to the API
+        system_role (str): The system role/prompt for the AI
+        cache_ttl (float, optional): Reuse an identical earlier answer for this many seconds
+        
+    Returns:
+        str: The AI response or error message
+    """
+    if _CONFIG_ERROR:
+        raise ValueError(_CONFIG_ERROR)
+    
+    if cache_ttl:
+        cache_key = _cache_key(query, system_role)
+        cached = _response_cache.get(cache_key)
+        if cached is not None:
+            logger.info("Returning cached response from Grok API")
+            return cached
+        # Identical prompts arriving while this one is in flight wait for its answer
+        return _in_flight.do(cache_key, _request_completion, query, system_role, cache_key, cache_ttl)
+    return _request_completion(query, system_role, None, None)
+
+def _request_completion(query: str, system_role: str, cache_key: Optional[str], cache_ttl: Optional[float]) -> str:
+    payload = _build_payload(query, system_role, stream=False)
     
     try:
-        logger.info(f"Sending request to Grok API: {GROK_API_URL}")
-        logger.info(f"Using Groq model: {GROQ_MODEL}")
-        logger.debug(f"Payload: {payload}")
+        logger.info("Sending request to Grok API: %s", GROK_API_URL)
+        logger.info("Using Groq model: %s", GROQ_MODEL)
+        logger.debug("Payload: %s", payload)
         
-        response = requests.post(
+        # Encoded with orjson; the session already sends Content-Type: application/json
+        response = _session.post(
             GROK_API_URL, 
-            json=payload, 
-            headers=headers,
+            data=orjson.dumps(payload), 
             timeout=60  # Add timeout to prevent hanging
         )
         response.raise_for_status()
         
-        data = response.json()
-        logger.debug(f"API Response: {data}")
+        # orjson parses the raw bytes directly; decode errors fall through to the generic handler
+        data = orjson.loads(response.content)
+        logger.debug("API Response: %s", data)
         
         if "choices" in data and len(data["choices"]) > 0:
             content = data["choices"][0]["message"]["content"]
             if content:
                 logger.info("Successfully received response from Grok API")
+                if cache_key is not None:
+                    _response_cache.set(cache_key, content, ttl=cache_ttl)
                 return content
             else:
                 logger.warning("Empty content received from API")
@@ -108,4 +149,58 @@ def ask_grok(query: str, system_role: str = "You are a helpful travel assistant.
     except Exception as e:
         error_msg = f"Unexpected error: {str(e)}"
         logger.error(error_msg)
-        return error_msg
\ No newline at end of file
+        return error_msg
+
+def stream_grok(query: str, system_role: str = "You are a helpful travel assistant.", cache_ttl: Optional[float] = None) -> Iterator[str]:
+    """
+    Stream a Grok completion, yielding content chunks as the API sends them
+    
+    Args:
+        query (str): The user query to send to the API
+        system_role (str): The system role/prompt for the AI
+        cache_ttl (float, optional): Serve an identical earlier answer for this many seconds,
+            and cache the streamed answer once it completes
+        
+    Yields:
+        str: Pieces of the AI response, in order
+        
+    Unlike ask_grok, request failures raise (requests.RequestException) instead of
+    being returned as text, since part of the answer may already have been sent.
+    """
+    if _CONFIG_ERROR:
+        raise ValueError(_CONFIG_ERROR)
+    
+    cache_key = None
+    if cache_ttl:
+        cache_key = _cache_key(query, system_role)
+        cached = _response_cache.get(cache_key)
+        if cached is not None:
+            logger.info("Returning cached response from Grok API")
+            yield cached
+            return
+    
+    logger.info("Streaming request to Grok API: %s", GROK_API_URL)
+    parts = []
+    with _session.post(
+        GROK_API_URL,
+        data=orjson.dumps(_build_payload(query, system_role, stream=True)),
+        stream=True,
+        timeout=60
+    ) as response:
+        response.raise_for_status()
+        # Server-sent events: one "data: {json}" line per chunk, "data: [DONE]" at the end
+        for line in response.iter_lines():
+            if not line.startswith(b"data: "):
+                continue
+            data = line[6:]
+            if data == b"[DONE]":
+                break
+            choices = orjson.loads(data).get("choices") or ()
+            content = choices[0].get("delta", {}).get("content") if choices else None
+            if content:
+                parts.append(content)
+                yield content
+    
+    if cache_key is not None and parts:
+        _response_cache.set(cache_key, "".join(parts), ttl=cache_ttl)
+    logger.info("Finished streaming response from Grok API")
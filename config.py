@@ -1,39 +1,10 @@
-from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import Optional
+# Single Settings schema lives in backend/config.py; re-exported for the root app
+from backend.config import Settings, get_settings
 
+__all__ = ["Settings", "get_settings", "settings"]
 
-class Settings(BaseSettings):
-    model_config = SettingsConfigDict(extra='ignore', env_file='.env', case_sensitive=False)
-    # MongoDB Configuration
-    mongodb_uri: str
-    database_name: str = "tripcraft"
-    
-    # JWT Configuration
-    secret_key: str
-    algorithm: str = "HS256"
-    access_token_expire_minutes: int = 30
 
-    # Server Configuration
-    host: str = "0.0.0.0"
-    port: int = 8005
-    debug: bool = True
-
-    # Add Amadeus config
-    amadeus_client_id: str
-    amadeus_client_secret: str
-    amadeus_hostname: str = "test.api.amadeus.com"
-
-
-    # Grok API Configuration
-    grok_api_key: str
-    grok_api_url: str
-    
-    
-    # Remove legacy Config; settings configured via model_config
-
-
-    
-
-
-# Create settings instance
-settings = Settings()
+def __getattr__(name: str):
+    if name == "settings":
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")